@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+#
+# usage: fontforge -lang=py -script benchmark.py [options]
+#
+# Runs ligaturize_font() over a fixed set of fonts, a few times each, and
+# records how long it took, how much memory it needed and how big the output
+# is, so that changes to ligaturize.py can be compared against each other.
+# Results are written as JSON; given a previous run's results as --baseline,
+# any metric that got worse by more than --threshold is reported as a
+# regression (and the exit status is 1).
+#
+# --synthetic generates fixture fonts with a given number of glyphs, plus a
+# ligature source font to go with them, so that scaling can be measured without
+# the font submodules.
+
+import fontforge
+import json
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from multiprocessing import get_context
+from os import path
+
+from char_dict import char_dict
+from joblog import peak_rss, reset_peak_rss
+from ligatures import ligatures
+from ligaturize import ligaturize_font
+
+# The fonts benchmarked if none are given on the command line: one CFF and one
+# TrueType family, each small enough to keep a run short.
+DEFAULT_FONTS = [
+    'fonts/Hermit/Hermit-Regular.otf',
+    'fonts/FantasqueSansMono-Normal/FantasqueSansMono-Regular.otf',
+    'fonts/FantasqueSansMono-Normal/FantasqueSansMono-Regular.ttf',
+]
+
+# Metrics where a higher number is worse, and which are compared against the
+# baseline.
+METRICS = ['wall_time', 'peak_rss_kb', 'output_size', 'glyph_count', 'lookup_count']
+
+# Width and em size of the synthetic fonts.
+SYNTHETIC_EM = 1000
+SYNTHETIC_WIDTH = 600
+
+def draw_box(glyph, width, height):
+    """Give glyph a rectangular outline and the given advance width."""
+    pen = glyph.glyphPen()
+    pen.moveTo((50, 0))
+    pen.lineTo((50, height))
+    pen.lineTo((width - 50, height))
+    pen.lineTo((width - 50, 0))
+    pen.closePath()
+    pen = None
+    glyph.width = width
+
+def new_synthetic_font(name):
+    font = fontforge.font()
+    font.em = SYNTHETIC_EM
+    font.fontname = font.familyname = font.fullname = name
+    for glyph_name, char in sorted(char_dict.items()) + [('space', ' '), ('m', 'm')]:
+        glyph = font.createChar(ord(char), glyph_name)
+        if glyph_name == 'space':
+            glyph.width = SYNTHETIC_WIDTH
+        else:
+            draw_box(glyph, SYNTHETIC_WIDTH, 700)
+    return font
+
+def make_synthetic_font(font_file, glyph_count):
+    """Generate a monospaced font with glyph_count glyphs, including all the
+    characters ligatures are made of."""
+    font = new_synthetic_font('Synthetic%d-Regular' % glyph_count)
+    for i in range(len(list(font.glyphs())), glyph_count):
+        draw_box(font.createChar(-1, 'filler%d' % i), SYNTHETIC_WIDTH, 500)
+    font.generate(font_file)
+    font.close()
+
+def make_synthetic_ligature_source(font_file):
+    """Generate a stand-in for Fira Code with a glyph for every ligature."""
+    font = new_synthetic_font('SyntheticLigatures-Regular')
+    for lig in ligatures:
+        if lig['firacode_ligature_name']:
+            draw_box(font.createChar(-1, lig['firacode_ligature_name']),
+                     SYNTHETIC_WIDTH * len(lig['chars']), 600)
+    font.generate(font_file)
+    font.close()
+
+def run_once(font_file, ligature_font_file, options, output_dir, conn):
+    """Ligaturize font_file once and send the measurements through conn.
+
+    Runs in a process of its own, so that earlier runs don't count towards its
+    peak RSS; the peak is reset after forking (where the OS allows it), so
+    that what the process inherited from the parent doesn't either.
+    """
+    try:
+        reset_peak_rss()
+        start = time.time()
+        result = ligaturize_font(
+            font_file, output_dir, ligature_font_file,
+            output_name=None, prefix='Bench', **options)
+        wall_time = time.time() - start
+        peak_rss_kb = peak_rss() // 1024
+
+        output_font_file = result['output_font_file']
+        output = fontforge.open(output_font_file)
+        glyph_count = len(list(output.glyphs()))
+        lookup_count = len(output.gsub_lookups)
+        output.close()
+        conn.send({
+            'wall_time': wall_time,
+            'peak_rss_kb': peak_rss_kb,
+            'output_size': path.getsize(output_font_file),
+            'glyph_count': glyph_count,
+            'lookup_count': lookup_count,
+        })
+    except Exception as e:
+        conn.send({'error': '%s: %s' % (type(e).__name__, e)})
+
+def benchmark_font(font_file, ligature_font_file, options, iterations):
+    """Ligaturize font_file iterations times and return a dict with the
+    individual runs and the median of each metric."""
+    context = get_context('fork')
+    runs = []
+    for _ in range(iterations):
+        output_dir = tempfile.mkdtemp(prefix='ligaturize-bench-')
+        receive, send = context.Pipe(duplex=False)
+        process = context.Process(
+            target=run_once,
+            args=(font_file, ligature_font_file, options, output_dir, send))
+        process.start()
+        send.close()
+        try:
+            run = receive.recv()
+        except EOFError:
+            run = {'error': 'worker died'}
+        process.join()
+        shutil.rmtree(output_dir)
+        if 'error' in run:
+            return {'error': run['error']}
+        runs.append(run)
+
+    median = {}
+    for metric in METRICS:
+        values = sorted(run[metric] for run in runs)
+        median[metric] = values[len(values) // 2]
+    return {'runs': runs, 'median': median}
+
+def compare(results, baseline, threshold):
+    """Return a list of (font, metric, baseline value, new value) for every
+    metric that is more than threshold (a fraction) worse than the baseline."""
+    regressions = []
+    for font, result in sorted(results['fonts'].items()):
+        old = baseline['fonts'].get(font, {}).get('median')
+        new = result.get('median')
+        if not old or not new:
+            continue
+        for metric in METRICS:
+            if metric in old and new[metric] > old[metric] * (1 + threshold):
+                regressions.append((font, metric, old[metric], new[metric]))
+    return regressions
+
+def print_results(results):
+    print('%-64s %9s %10s %10s %7s %7s' % (
+        'font', 'time (s)', 'rss (KiB)', 'size', 'glyphs', 'lookups'))
+    for font, result in sorted(results['fonts'].items()):
+        if 'error' in result:
+            print('%-64s %s' % (font, result['error']))
+            continue
+        median = result['median']
+        print('%-64s %9.2f %10d %10d %7d %7d' % (
+            font, median['wall_time'], median['peak_rss_kb'],
+            median['output_size'], median['glyph_count'], median['lookup_count']))
+
+def parse_args():
+    parser = ArgumentParser(
+        description="Measure how long ligaturizing fonts takes and what it produces.")
+    parser.add_argument("fonts",
+        nargs='*', metavar='FONT',
+        help="The fonts to benchmark. Defaults to a few of the fonts in fonts/"
+             " (unless --synthetic is given).")
+    parser.add_argument("--synthetic",
+        type=lambda s: [int(n) for n in s.split(',')], default=[],
+        metavar='N[,N...]',
+        help="Also benchmark generated fonts with these numbers of glyphs,"
+             " ligaturized from a generated ligature source font.")
+    parser.add_argument("--ligature-font-file",
+        type=str, default=None, metavar='FILE',
+        help="The file to copy ligatures from. Defaults to guessing a Fira"
+             " Code weight, as ligaturize.py does.")
+    parser.add_argument("--iterations", "-n",
+        type=int, default=3,
+        help="How many times to ligaturize each font. Default: 3.")
+    parser.add_argument("--output", "-o",
+        type=str, default=None, metavar='FILE',
+        help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline",
+        type=str, default=None, metavar='FILE',
+        help="Compare the results against those of an earlier run.")
+    parser.add_argument("--threshold",
+        type=float, default=0.1,
+        help="How much worse (as a fraction) than the baseline a metric may"
+             " get before it counts as a regression. Default: 0.1.")
+    parser.add_argument("--copy-character-glyphs",
+        default=False, action='store_true',
+        help="Benchmark with --copy-character-glyphs.")
+    parser.add_argument("--merge-calt-lookups",
+        default=False, action='store_true',
+        help="Benchmark with --merge-calt-lookups.")
+    parser.add_argument("--shared-spacer",
+        default=False, action='store_true',
+        help="Benchmark with --shared-spacer.")
+    parser.add_argument("--minimal-calt-rules",
+        default=False, action='store_true',
+        help="Benchmark with --minimal-calt-rules.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    fonts = args.fonts or ([] if args.synthetic else DEFAULT_FONTS)
+    options = {
+        'copy_character_glyphs': args.copy_character_glyphs,
+        'merge_calt_lookups': args.merge_calt_lookups,
+        'shared_spacer': args.shared_spacer,
+        'minimal_calt_rules': args.minimal_calt_rules,
+        'scale_character_glyphs_threshold': 0.1,
+    }
+    results = {'iterations': args.iterations, 'options': options, 'fonts': {}}
+
+    for font_file in fonts:
+        results['fonts'][font_file] = benchmark_font(
+            font_file, args.ligature_font_file, options, args.iterations)
+
+    if args.synthetic:
+        fixture_dir = tempfile.mkdtemp(prefix='ligaturize-fixtures-')
+        try:
+            ligature_font_file = path.join(fixture_dir, 'SyntheticLigatures.otf')
+            make_synthetic_ligature_source(ligature_font_file)
+            for glyph_count in args.synthetic:
+                font_file = path.join(fixture_dir, 'Synthetic%d.otf' % glyph_count)
+                make_synthetic_font(font_file, glyph_count)
+                results['fonts']['synthetic-%d' % glyph_count] = benchmark_font(
+                    font_file, ligature_font_file, options, args.iterations)
+        finally:
+            shutil.rmtree(fixture_dir)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
+
+    failed = any('error' in result for result in results['fonts'].values())
+    if args.baseline:
+        with open(args.baseline) as fd:
+            baseline = json.load(fd)
+        regressions = compare(results, baseline, args.threshold)
+        for font, metric, old, new in regressions:
+            print('REGRESSION: %s: %s went from %s to %s' % (font, metric, old, new))
+        if not regressions:
+            print('No regressions against %s.' % args.baseline)
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -21,9 +21,48 @@ COPY_CHARACTER_GLYPHS = False
 # effectively disable this feature.
 SCALE_CHARACTER_GLYPHS_THRESHOLD = 0.1
 
+# Should ligatures that can never overlap share calt lookups? This shapes text
+# the same way but produces far fewer lookups; see --merge-calt-lookups in
+# ligaturize.py.
+MERGE_CALT_LOOKUPS = False
+
+# Should all ligatures use one shared spacer glyph rather than one spacer glyph
+# per ligature character? See --shared-spacer in ligaturize.py.
+SHARED_SPACER = False
+
+# Should calt rules leave out the context that can never make a difference to
+# where they match? See --minimal-calt-rules in ligaturize.py.
+MINIMAL_CALT_RULES = False
+
+# Should the ligature lookups be written to a .fea file next to each output
+# font and merged from there? See --feature-file in ligaturize.py.
+USE_FEATURE_FILE = False
+
+# Where to cache width-corrected ligature outlines (and which ligatures each
+# ligature source has) between fonts and runs, and how big the outline cache
+# may get, in megabytes. None disables the cache. See
+# --cache-dir in ligaturize.py.
+CACHE_DIR = None
+OUTLINE_CACHE_SIZE = 256
+
+# Should only the tables ligaturizing changes be rewritten, and all others be
+# copied from the input font as they are? Needs fontTools. See --patch in
+# ligaturize.py.
+PATCH_TABLES = False
+
+# What to ligaturize fonts with: 'fontforge' (run build.py from fontforge, as
+# the Makefile does) or 'fonttools' (run it with any Python that has fontTools
+# installed). See --engine in ligaturize.py.
+ENGINE = 'fontforge'
+
 # Where to put the generated fonts.
 OUTPUT_DIR = 'fonts/output/'
 
+# The release archives --pack writes, for fonts without and with copied
+# character glyphs.
+ARCHIVE_NAME = 'LigaturizedFonts.zip'
+ARCHIVE_NAME_WITH_CHARACTERS = 'LigaturizedFontsWithCharacters.zip'
+
 #### Fonts that should be prefixed with "Liga" when ligaturized. ####
 # Don't put fonts licensed under UFL here, and don't put fonts licensed under
 # SIL OFL here either unless they haven't specified a Reserved Font Name.
@@ -89,35 +128,553 @@ renamed_fonts = {
 
 #### No user serviceable parts below this line. ####
 
+import gc
+import hashlib
+import json
+import os
 import sys
+import time
+import traceback
+from argparse import ArgumentParser
+from functools import partial
 from glob import glob
-from ligaturize import ligaturize_font
+from importlib.util import find_spec
+from multiprocessing import get_all_start_methods, get_context
+
+import ligaturize
+from char_dict import char_dict
+from ligaturize import get_engine
+from ligature_plan import check_ligatures
+from joblog import LOG_FORMATS, event_log, run_logged
+from pack import Packer
+from shards import (LOG_NAME, assign_shards, job_cost, parse_shard, read_jobs_file,
+                    shard_file, write_jobs_file)
+from worker_pool import RecyclingPool
+from ligatures import ligatures
+
+# Written to the output directory; records what each output was built from, so
+# that unchanged fonts can be skipped on the next run.
+MANIFEST_NAME = 'ligaturize-manifest.json'
+
+# Scripts whose source is part of the manifest key, since changing them can
+# change the output.
+SOURCE_FILES = ['gsub.py', 'ligaturize.py', 'fonttools_engine.py', 'table_patch.py',
+                'variable_font.py', 'ligature_plan.py', 'webfont.py']
+
+# Written to the output directory by --report; the footprint reports of all
+# fonts in it, and their totals.
+REPORT_NAME = 'ligaturize-report.json'
+
+# Job options that don't affect the output, and so aren't part of the key.
+CACHE_OPTIONS = ['cache_dir', 'outline_cache_size']
+
+def parse_args():
+  parser = ArgumentParser()
+  parser.add_argument("--copy-character-glyphs",
+    default=False, action='store_true',
+    help="Copy individual character glyphs as well as ligatures, and write the"
+         " output to fonts/output-with-characters/ instead.")
+  parser.add_argument("--jobs", "-j",
+    type=int, default=1, metavar='N',
+    help="Ligaturize up to N fonts at once, each in its own worker process."
+         " 0 means one worker per CPU.")
+  parser.add_argument("--max-jobs-per-worker",
+    type=int, default=0, metavar='N',
+    help="Replace each worker process with a fresh one after it has"
+         " ligaturized N fonts, so that memory use stays bounded. Implies"
+         " running fonts in worker processes, even with --jobs=1.")
+  parser.add_argument("--max-worker-memory",
+    type=int, default=0, metavar='MB',
+    help="Replace each worker process with a fresh one once its resident"
+         " memory use exceeds MB after a font, like --max-jobs-per-worker.")
+  parser.add_argument("--force",
+    default=False, action='store_true',
+    help="Rebuild every font, even ones the manifest says are up to date.")
+  parser.add_argument("--pack",
+    default=False, action='store_true',
+    help="Package fonts for release while the build runs: write WOFF and WOFF2"
+         " copies of each font as soon as it's done, and add them all to %s (or"
+         " %s) and SHA256SUMS. Needs fontTools, and brotli for WOFF2." % (
+           ARCHIVE_NAME, ARCHIVE_NAME_WITH_CHARACTERS))
+  parser.add_argument("--log-format",
+    choices=LOG_FORMATS, default='text',
+    help="'jsonl' writes one JSON object per line to stdout for every font"
+         " started, phase finished, font done, failed or already up to date,"
+         " and a summary at the end; everything else goes to stderr. Either way,"
+         " what fontforge writes to stderr is counted per font rather than shown."
+         " Default: text.")
+  parser.add_argument("--report",
+    default=False, action='store_true',
+    help="Write a footprint report for every font (see --report in"
+         " ligaturize.py), and combine them into %s in the output directory." % REPORT_NAME)
+  parser.add_argument("--write-jobs",
+    metavar='FILE',
+    help="Write the list of fonts to build, with every pattern above expanded,"
+         " and their options to FILE for --jobs-file, and exit.")
+  parser.add_argument("--jobs-file",
+    metavar='FILE',
+    help="Build the fonts in FILE, written by --write-jobs, instead of those"
+         " above. Its options (and output directory) take the place of"
+         " --copy-character-glyphs and --report.")
+  parser.add_argument("--shard",
+    type=parse_shard, metavar='I/N',
+    help="Build only shard I of N: about 1/N of the fonts, picked so that the"
+         " N shards take about as long as each other. Each shard writes its"
+         " own manifest and log to the output directory; merge them with"
+         " --merge-shards=N.")
+  parser.add_argument("--merge-shards",
+    type=int, metavar='N',
+    help="Don't build anything; check that shards 1/N to N/N built all of the"
+         " fonts, and combine their manifests, logs (into %s) and reports"
+         " (with --report or a jobs file that has it). With --pack, package"
+         " all of the fonts." % LOG_NAME)
+  args = parser.parse_args()
+  if args.write_jobs and (args.shard or args.merge_shards or args.jobs_file):
+    parser.error("--write-jobs can't be combined with --jobs-file, --shard or --merge-shards")
+  if args.shard and args.merge_shards:
+    parser.error("--shard and --merge-shards can't be combined")
+  if args.shard and args.pack:
+    parser.error("a shard only has some of the fonts to --pack; pass --pack to"
+                 " --merge-shards instead")
+  if args.merge_shards is not None and args.merge_shards < 1:
+    parser.error("--merge-shards needs the number of shards")
+  return args
+
+def expand_jobs(output_dir, copy_character_glyphs, report=False):
+  """Turn the font lists above into a list of ligaturize_font() keyword args.
+
+  Every pattern is expanded before anything is built, so a pattern that
+  doesn't match any files stops the build before it starts.
+  """
+  jobs = []
+  def add_jobs(pattern, prefix, output_name):
+    # Sorted, so that every machine expands the same jobs in the same order.
+    files = sorted(glob(pattern))
+    if not files:
+      print("Error: pattern '%s' didn't match any files." % pattern)
+      sys.exit(1)
+    for input_file in files:
+      jobs.append(dict(
+        input_font_file=input_file, ligature_font_file=None,
+        output_dir=output_dir, prefix=prefix, output_name=output_name,
+        copy_character_glyphs=copy_character_glyphs,
+        scale_character_glyphs_threshold=SCALE_CHARACTER_GLYPHS_THRESHOLD,
+        merge_calt_lookups=MERGE_CALT_LOOKUPS,
+        shared_spacer=SHARED_SPACER,
+        minimal_calt_rules=MINIMAL_CALT_RULES,
+        feature_file=USE_FEATURE_FILE,
+        cache_dir=CACHE_DIR, outline_cache_size=OUTLINE_CACHE_SIZE,
+        report=report, patch=PATCH_TABLES, engine=ENGINE))
+
+  for pattern in prefixed_fonts:
+    add_jobs(pattern, LIGATURIZED_FONT_NAME_PREFIX, None)
+  for pattern,name in renamed_fonts.items():
+    add_jobs(pattern, None, name)
+  return jobs
+
+def run_job(job, log_format='text'):
+  """Run one job, logging it in log_format (see joblog.py).
+
+  Returns a dict with the job, the result of ligaturize_font() or None, the
+  traceback if it failed or None, what it wrote to stderr ({line: count}),
+  and the pid and ligature source cache info of the process that ran it.
+  """
+  result = error = peak_rss = None
+  warnings = {}
+  engine = ligaturize
+  try:
+    options = dict(job)
+    engine = get_engine(options.pop('engine'))
+  except Exception:
+    error = traceback.format_exc()
+  else:
+    result, error, warnings, peak_rss = run_logged(
+      event_log(log_format), engine.ligaturize_font, options)
+    # Don't let a failed job's font linger until the worker exits.
+    engine.close_fonts()
+    gc.collect()
+  return {
+    'job': job, 'result': result, 'error': error, 'warnings': warnings,
+    'peak_rss': peak_rss,
+    'pid': os.getpid(), 'cache': engine.ligature_source_cache_info(),
+  }
+
+def crashed_job(job, exitcode, log_format='text'):
+  """The outcome of a job whose worker process died while running it."""
+  error = "Worker process died with exit code %s (out of memory?)" % exitcode
+  event_log(log_format).event('failed', input_font_file=job['input_font_file'], error=error)
+  return {
+    'job': job, 'result': None, 'error': error, 'warnings': {}, 'peak_rss': None,
+    'pid': None, 'cache': None,
+  }
+
+def run_jobs(jobs, nrof_workers, finished=None, log_format='text',
+             max_jobs_per_worker=0, max_worker_rss=0):
+  """Run all jobs, in parallel if nrof_workers > 1. Returns their outcomes.
+
+  If given, finished is called with each outcome as soon as it's there.
+
+  With max_jobs_per_worker or max_worker_rss (in bytes), jobs always run in
+  worker processes, which are replaced after that many jobs or once they use
+  that much memory (see worker_pool.py).
+  """
+  if not jobs:
+    return []
+  run = partial(run_job, log_format=log_format)
+  if nrof_workers <= 0:
+    nrof_workers = os.cpu_count() or 1
+  if max_jobs_per_worker or max_worker_rss:
+    pool = RecyclingPool(nrof_workers, max_jobs_per_worker, max_worker_rss)
+    outcomes = collect_outcomes(pool.imap_unordered(
+      run, jobs, partial(crashed_job, log_format=log_format)), finished)
+    print("Ran %d fonts in %d worker processes." % (len(outcomes), pool.workers_started))
+    return outcomes
+  if nrof_workers == 1:
+    return collect_outcomes(map(run, jobs), finished)
+
+  # Each worker is a fork of this process, and thus has its own copy of the
+  # fontforge interpreter state.
+  if 'fork' in get_all_start_methods():
+    context = get_context('fork')
+  else:
+    context = get_context()
+  with context.Pool(nrof_workers) as pool:
+    return collect_outcomes(pool.imap_unordered(run, jobs), finished)
+
+def collect_outcomes(outcomes, finished=None):
+  collected = []
+  # Latest ligature source cache info from each worker process.
+  caches = {}
+  # The outcome with the highest peak memory use.
+  peak = None
+  for outcome in outcomes:
+    if outcome['cache']:
+      caches[outcome['pid']] = outcome['cache']
+    if outcome['peak_rss'] and (not peak or outcome['peak_rss'] > peak['peak_rss']):
+      peak = outcome
+    if outcome['error']:
+      print("Error: failed to ligaturize '%s':\n%s" % (
+        outcome['job']['input_font_file'], outcome['error']))
+    if finished:
+      finished(outcome)
+    collected.append(outcome)
+  if caches:
+    print("Ligature source cache: %d hits, %d misses across %d processes." % (
+      sum(cache['hits'] for cache in caches.values()),
+      sum(cache['misses'] for cache in caches.values()),
+      len(caches)))
+  if peak:
+    print("Peak memory use: %.1f MB, for '%s'." % (
+      peak['peak_rss'] / 1048576.0, peak['job']['input_font_file']))
+  return collected
+
+def combine_reports(jobs, manifest, output_dir):
+  """Combine the footprint reports of all jobs, including those that were up
+  to date, print them and write them to the output directory.
 
-if '--copy-character-glyphs' in sys.argv:
-  COPY_CHARACTER_GLYPHS=True
-  OUTPUT_DIR='fonts/output-with-characters'
+  Returns the reports whose checks failed.
+  """
+  reports = []
+  for job in jobs:
+    report_file = manifest.get(job_id(job), {}).get('report_file')
+    if report_file and os.path.exists(report_file):
+      with open(report_file) as fd:
+        reports.append(json.load(fd))
 
+  totals = {'file_size': {'before': 0, 'after': 0}, 'tables': {},
+            'glyphs_added': 0, 'lookups_added': 0}
+  for report in reports:
+    for size in ['before', 'after']:
+      totals['file_size'][size] += report['file_size'][size]
+    for tag,sizes in report['tables'].items():
+      total = totals['tables'].setdefault(tag, {'before': 0, 'after': 0})
+      for size in ['before', 'after']:
+        total[size] += sizes[size]
+    totals['glyphs_added'] += report['glyphs_added']
+    totals['lookups_added'] += report['lookups_added']
 
-for pattern in prefixed_fonts:
-  files = glob(pattern)
-  if not files:
-    print("Error: pattern '%s' didn't match any files." % pattern)
+  print("%-48s %10s %10s %9s %7s %8s" % (
+    'font', 'before', 'after', 'growth', 'glyphs', 'lookups'))
+  for report in reports + [dict(totals, output_font_file='total', ok=True)]:
+    print("%-48s %10d %10d %+8.1f%% %7d %8d%s" % (
+      os.path.basename(report['output_font_file']),
+      report['file_size']['before'], report['file_size']['after'],
+      100.0 * (report['file_size']['after'] - report['file_size']['before'])
+        / max(report['file_size']['before'], 1),
+      report['glyphs_added'], report['lookups_added'],
+      '' if report['ok'] else '  CHECKS FAILED'))
+
+  with open(os.path.join(output_dir, REPORT_NAME), 'w') as fd:
+    json.dump({'fonts': reports, 'totals': totals}, fd, indent=2, sort_keys=True)
+  return [report for report in reports if not report['ok']]
+
+#### Incremental builds ####
+# Each output is keyed by a hash of everything that goes into it. If the key
+# recorded in the manifest matches and the output still exists, the job is
+# skipped.
+
+_digests = {}
+
+def file_digest(path):
+  if path not in _digests:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fd:
+      for block in iter(lambda: fd.read(1 << 20), b''):
+        digest.update(block)
+    _digests[path] = digest.hexdigest()
+  return _digests[path]
+
+def job_id(job):
+  return '%s:%s:%s' % (job['input_font_file'], job['prefix'] or '', job['output_name'] or '')
+
+def job_key(job, ligature_font_file):
+  """Hash the input font, ligature source, ligature tables, options and scripts."""
+  options = dict((k, v) for k, v in job.items()
+                 if k != 'input_font_file' and k not in CACHE_OPTIONS)
+  key = hashlib.sha256()
+  for part in [
+      file_digest(job['input_font_file']),
+      ligature_font_file,
+      file_digest(ligature_font_file),
+      json.dumps(ligatures, sort_keys=True),
+      json.dumps(char_dict, sort_keys=True),
+      json.dumps(options, sort_keys=True)] + [
+      file_digest(os.path.join(os.path.dirname(os.path.abspath(__file__)), name))
+      for name in SOURCE_FILES]:
+    key.update(part.encode('utf-8'))
+    key.update(b'\0')
+  return key.hexdigest()
+
+def load_manifest(output_dir, name=MANIFEST_NAME):
+  try:
+    with open(os.path.join(output_dir, name)) as fd:
+      return json.load(fd)
+  except (IOError, ValueError):
+    return {}
+
+def save_manifest(output_dir, manifest, name=MANIFEST_NAME):
+  write_json(os.path.join(output_dir, name), manifest)
+
+def is_up_to_date(job, entry):
+  """Check a job against its manifest entry, if it has one."""
+  if not entry or not os.path.exists(entry['output_font_file']):
+    return False
+  # The ligature source is picked based on the input font, so if the input is
+  # unchanged we'd pick the same one as last time -- but its contents may have
+  # changed since.
+  if not os.path.exists(entry['ligature_font_file']):
+    return False
+  return entry['key'] == job_key(job, entry['ligature_font_file'])
+
+#### Sharded builds ####
+# See shards.py.
+
+def write_json(file, data):
+  with open(file + '.tmp', 'w') as fd:
+    json.dump(data, fd, indent=2, sort_keys=True)
+  os.replace(file + '.tmp', file)
+
+def merge_shards(jobs, output_dir, count):
+  """Check that shards 1 to count between them built every job, and merge
+  their manifests into the output directory's and their logs into LOG_NAME.
+
+  Returns the merged manifest and a list of the problems found.
+  """
+  manifest = load_manifest(output_dir)
+  logs, problems = [], []
+  # {job id: shard it's in}
+  shard_of = {}
+  for index in range(1, count + 1):
+    log_file = os.path.join(output_dir, shard_file(LOG_NAME, index, count))
+    try:
+      with open(log_file) as fd:
+        logs.append(json.load(fd))
+    except (IOError, ValueError):
+      problems.append("shard %d/%d has no log (%s); did it finish?" % (index, count, log_file))
+      continue
+    manifest.update(load_manifest(output_dir, shard_file(MANIFEST_NAME, index, count)))
+    for id in logs[-1]['fonts']:
+      shard_of[id] = index
+    for id in sorted(logs[-1]['failed']):
+      problems.append("shard %d/%d failed to ligaturize %s" % (index, count, id))
+  if len(logs) < count:
+    return manifest, problems
+
+  ids = set(job_id(job) for job in jobs)
+  for id in sorted(set(shard_of) - ids):
+    problems.append("shard %d/%d built %s, which isn't in the job list; was it given"
+                    " a different jobs file?" % (shard_of[id], count, id))
+  failed = set(id for shard_log in logs for id in shard_log['failed'])
+  for job in jobs:
+    id = job_id(job)
+    if id not in shard_of:
+      problems.append("%s isn't in any shard" % id)
+    elif id not in failed and not is_up_to_date(job, manifest.get(id)):
+      problems.append("shard %d/%d has no up to date output for %s" % (shard_of[id], count, id))
+    else:
+      continue
+    manifest.pop(id, None)
+
+  for shard_log in logs:
+    print("Shard %d/%d: %d fonts (%.1f MB), %d built, %d up to date, %d failed, in %.1f s." % (
+      shard_log['shard'][0], count, len(shard_log['fonts']), shard_log['cost'] / 1048576.0,
+      len(shard_log['built']), len(shard_log['up_to_date']), len(shard_log['failed']),
+      shard_log['seconds']))
+  write_json(os.path.join(output_dir, LOG_NAME), {
+    'shards': logs,
+    'fonts': sum(len(shard_log['fonts']) for shard_log in logs),
+    'built': sum(len(shard_log['built']) for shard_log in logs),
+    'up_to_date': sum(len(shard_log['up_to_date']) for shard_log in logs),
+    'failed': len(failed),
+    'seconds': max(shard_log['seconds'] for shard_log in logs),
+    'peak_rss': max(shard_log['peak_rss'] for shard_log in logs),
+  })
+  return manifest, problems
+
+def main():
+  args = parse_args()
+  start = time.time()
+  log = event_log(args.log_format)
+  log.claim_stdout()
+  problems = check_ligatures()
+  if problems:
+    print("Error: problems in ligatures.py:")
+    for problem in problems:
+      print("    %s" % problem)
     sys.exit(1)
-  for input_file in files:
-    ligaturize_font(
-      input_file, ligature_font_file=None, output_dir=OUTPUT_DIR,
-      prefix=LIGATURIZED_FONT_NAME_PREFIX, output_name=None,
-      copy_character_glyphs=COPY_CHARACTER_GLYPHS,
-      scale_character_glyphs_threshold=SCALE_CHARACTER_GLYPHS_THRESHOLD)
-
-for pattern,name in renamed_fonts.items():
-  files = glob(pattern)
-  if not files:
-    print("Error: pattern '%s' didn't match any files." % pattern)
+  copy_character_glyphs = COPY_CHARACTER_GLYPHS
+  output_dir = OUTPUT_DIR
+  if args.copy_character_glyphs:
+    copy_character_glyphs = True
+    output_dir = 'fonts/output-with-characters'
+
+  costs = None
+  if args.jobs_file:
+    output_dir, all_jobs, costs = read_jobs_file(args.jobs_file)
+    copy_character_glyphs = any(job['copy_character_glyphs'] for job in all_jobs)
+  else:
+    all_jobs = expand_jobs(output_dir, copy_character_glyphs, args.report)
+  if args.write_jobs:
+    write_jobs_file(args.write_jobs, output_dir, all_jobs)
+    print("Wrote %d fonts to build to %s." % (len(all_jobs), args.write_jobs))
+    return
+  reporting = any(job['report'] for job in all_jobs)
+
+  manifest_name = MANIFEST_NAME
+  merge_problems = []
+  if args.shard:
+    index, count = args.shard
+    costs = costs or [job_cost(job) for job in all_jobs]
+    shard = assign_shards(costs, count)[index - 1]
+    shard_cost = sum(costs[i] for i in shard)
+    print("Shard %d/%d: %d of %d fonts (%.1f of %.1f MB)." % (
+      index, count, len(shard), len(all_jobs), shard_cost / 1048576.0, sum(costs) / 1048576.0))
+    all_jobs = [all_jobs[i] for i in shard]
+    manifest_name = shard_file(MANIFEST_NAME, index, count)
+
+  jobs = all_jobs
+  if args.merge_shards:
+    manifest, merge_problems = merge_shards(all_jobs, output_dir, args.merge_shards)
+    # Everything has been built, by the shards.
+    jobs = []
+  else:
+    manifest = load_manifest(output_dir)
+    if args.shard:
+      # What the shard built last time, on top of what was last merged.
+      manifest.update(load_manifest(output_dir, manifest_name))
+  if not args.force and jobs:
+    stale = [job for job in jobs if not is_up_to_date(job, manifest.get(job_id(job)))]
+    if len(stale) < len(jobs):
+      print("Skipping %d of %d fonts that are already up to date." % (
+        len(jobs) - len(stale), len(jobs)))
+    for job in jobs:
+      if job not in stale:
+        log.event('up_to_date', input_font_file=job['input_font_file'],
+                  output_font_file=manifest[job_id(job)]['output_font_file'])
+    jobs = stale
+
+  packer = None
+  finished = None
+  if args.pack and not merge_problems:
+    if not find_spec('fontTools'):
+      print("Error: --pack needs fontTools (pip install fonttools).")
+      sys.exit(1)
+    archive = ARCHIVE_NAME_WITH_CHARACTERS if copy_character_glyphs else ARCHIVE_NAME
+    packer = Packer(archive)
+    # Fonts that are already up to date can be packed right away.
+    for job in all_jobs:
+      if job not in jobs:
+        packer.add(manifest[job_id(job)]['output_font_file'])
+    def pack_outcome(outcome):
+      if not outcome['error']:
+        packer.add(outcome['result']['output_font_file'])
+    finished = pack_outcome
+
+  failures = []
+  warnings = {}
+  peak_rss = 0
+  for outcome in run_jobs(jobs, args.jobs, finished, args.log_format,
+                         args.max_jobs_per_worker, args.max_worker_memory << 20):
+    job,result = outcome['job'],outcome['result']
+    peak_rss = max(peak_rss, outcome['peak_rss'] or 0)
+    if outcome['warnings']:
+      warnings[job_id(job)] = outcome['warnings']
+    if outcome['error']:
+      failures.append((job, outcome['error']))
+      manifest.pop(job_id(job), None)
+    else:
+      manifest[job_id(job)] = dict(result, key=job_key(job, result['ligature_font_file']))
+  if args.shard:
+    # Only this shard's fonts; --merge-shards adds them to the full manifest.
+    ids = set(job_id(job) for job in all_jobs)
+    manifest = dict((id, entry) for id, entry in manifest.items() if id in ids)
+  save_manifest(output_dir, manifest, manifest_name)
+
+  if args.shard:
+    failed = dict((job_id(job), error) for job,error in failures)
+    write_json(os.path.join(output_dir, shard_file(LOG_NAME, *args.shard)), {
+      'shard': list(args.shard), 'cost': shard_cost,
+      'fonts': [job_id(job) for job in all_jobs],
+      'built': [job_id(job) for job in jobs if job_id(job) not in failed],
+      'up_to_date': [job_id(job) for job in all_jobs if job not in jobs],
+      'failed': failed, 'warnings': warnings, 'peak_rss': peak_rss,
+      'seconds': round(time.time() - start, 3),
+    })
+
+  failed_checks = []
+  # A shard only has some of the reports; --merge-shards combines them all.
+  if reporting and not args.shard and not merge_problems:
+    failed_checks = combine_reports(all_jobs, manifest, output_dir)
+    for report in failed_checks:
+      print("Error: %s failed its footprint checks; see %s.footprint.json" % (
+        report['output_font_file'], report['output_font_file']))
+
+  pack_errors = []
+  if packer:
+    # An archive with fonts missing is no good for a release.
+    packed = packer.finish(output_dir, keep=not failures)
+    pack_errors = packed['errors']
+    for font_file,error in pack_errors:
+      print("Error: failed to pack '%s':\n%s" % (font_file, error))
+    if not failures and not pack_errors:
+      print("Packed %d files into %s." % (packed['files'], packer.archive_file))
+
+  log.event('build_done', output_dir=output_dir, fonts=len(all_jobs),
+            built=len(jobs) - len(failures), failed=len(failures),
+            up_to_date=len(all_jobs) - len(jobs), failed_checks=len(failed_checks),
+            pack_errors=len(pack_errors), seconds=round(time.time() - start, 3),
+            peak_rss=peak_rss, shard='%d/%d' % args.shard if args.shard else None,
+            merged_shards=args.merge_shards, merge_problems=merge_problems)
+  if failures:
+    print("Error: %d of %d fonts failed to ligaturize:" % (len(failures), len(jobs)))
+    for job,_ in failures:
+      print("    %s" % job['input_font_file'])
+  if merge_problems:
+    print("Error: the shards didn't build every font:")
+    for problem in merge_problems:
+      print("    %s" % problem)
+  if failures or failed_checks or pack_errors or merge_problems:
     sys.exit(1)
-  for input_file in files:
-    ligaturize_font(
-      input_file, ligature_font_file=None, output_dir=OUTPUT_DIR,
-      prefix=None, output_name=name,
-      copy_character_glyphs=COPY_CHARACTER_GLYPHS,
-      scale_character_glyphs_threshold=SCALE_CHARACTER_GLYPHS_THRESHOLD)
+
+if __name__ == '__main__':
+  main()
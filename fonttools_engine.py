@@ -0,0 +1,600 @@
+#!/usr/bin/env python
+#
+# usage: python fonttools_engine.py <input file> [ligaturize.py options]
+#
+# A second implementation of ligaturize_font() that reads and writes fonts with
+# fontTools rather than fontforge, so it runs under any Python interpreter
+# (pip install fonttools) and can be imported like any other module. Select it
+# with --engine=fonttools in ligaturize.py or ENGINE in build.py.
+#
+# It plans the same lookups as the fontforge engine (see gsub.py) and copies
+# and width-corrects glyphs the same way, but:
+#  - anchors are not copied;
+#  - the GSUB lookups are built from the same feature file source as with
+#    --feature-file, and put in front of the font's existing lookups, as
+#    fontforge would;
+#  - variable fonts are supported (see variable_font.py).
+
+import sys
+from os import path
+
+from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+from fontTools.misc.roundTools import otRound
+from fontTools.misc.transform import Transform
+from fontTools.pens.boundsPen import BoundsPen
+from fontTools.pens.cu2quPen import Cu2QuPen
+from fontTools.pens.recordingPen import DecomposingRecordingPen, RecordingPen
+from fontTools.pens.reverseContourPen import ReverseContourPen
+from fontTools.pens.t2CharStringPen import T2CharStringPen
+from fontTools.pens.transformPen import TransformPen
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from fontTools.ttLib import TTFont
+from fontTools.ttLib.tables import otTables
+
+from char_dict import char_dict
+from gsub import GsubPlan
+from ligature_plan import resolve_ligatures
+from ligaturize import COPYRIGHT, get_ligature_source
+from profiling import NullProfiler, Profiler
+from table_patch import drop_stale_tables, patch_font
+from webfont import subset_font, web_subset
+
+# Ligature source fonts we've already opened, keyed by path. Unlike with
+# fontforge, scaling happens while copying, so one copy serves every em size.
+_ligature_sources = {}
+_ligature_source_stats = {'hits': 0, 'misses': 0}
+
+def open_ligature_source(ligature_font_file):
+    """Open a ligature source font, reusing it if we already opened it earlier
+    in this process."""
+    key = path.abspath(ligature_font_file)
+    if key in _ligature_sources:
+        _ligature_source_stats['hits'] += 1
+        return _ligature_sources[key]
+
+    _ligature_source_stats['misses'] += 1
+    source = TTFont(ligature_font_file)
+    _ligature_sources[key] = source
+    return source
+
+def ligature_source_cache_info():
+    """Return the hit/miss counts and size of the ligature source cache."""
+    return dict(_ligature_source_stats, size=len(_ligature_sources))
+
+def close_fonts():
+    """Nothing to do: unlike fontforge, fontTools keeps no fonts open behind
+    our back, and TTFonts are freed once nothing refers to them."""
+
+class LigatureCreator(object):
+
+    def __init__(self, font, source,
+                 scale_character_glyphs_threshold,
+                 copy_character_glyphs,
+                 merge_calt_lookups=False,
+                 shared_spacer=False,
+                 minimal_calt_rules=False):
+        self.font = font
+        self.source = source
+        self.scale_character_glyphs_threshold = scale_character_glyphs_threshold
+        self.should_copy_character_glyphs = copy_character_glyphs
+        self.plan = GsubPlan(merge_lookups=merge_calt_lookups,
+                             shared_spacer=shared_spacer,
+                             minimal_rules=minimal_calt_rules)
+        self._lig_counter = 0
+        self._shared_spacer_name = None
+        self.spacer_glyph_count = 0
+        self.spacer_position_count = 0
+
+        if 'glyf' in font:
+            self._cff = None
+        elif 'CFF ' in font:
+            cff = font['CFF '].cff
+            self._cff = (cff, cff[cff.fontNames[0]])
+            if hasattr(self._cff[1], 'FDArray'):
+                raise ValueError("CID-keyed CFF fonts aren't supported by the fonttools engine")
+        else:
+            raise ValueError("Only fonts with glyf or CFF outlines are supported by the fonttools engine")
+
+        self.glyph_order = list(font.getGlyphOrder())
+        self._glyph_names = set(self.glyph_order)
+        self.cmap = font.getBestCmap()
+        self.char_glyphs = dict((name, self.cmap[ord(char)]) for name, char in char_dict.items()
+                                if ord(char) in self.cmap)
+        self.hmtx = font['hmtx']
+        self.source_glyphs = source.getGlyphSet()
+        # Cubic outlines need converting (and reversing) for glyf, and the
+        # other way around.
+        self._reverse = ('CFF ' in source) != (self._cff is not None)
+        self.scale = float(font['head'].unitsPerEm) / source['head'].unitsPerEm
+        self.emwidth = self.hmtx[self.cmap[ord('m')]][0]
+        self.spacewidth = self.hmtx[self.cmap[ord(' ')]][0]
+
+    def record_outline(self, source_name):
+        """Return the outline of a source glyph, with components decomposed."""
+        pen = DecomposingRecordingPen(self.source_glyphs)
+        self.source_glyphs[source_name].draw(pen)
+        return pen
+
+    def set_glyph(self, name, outline, transform, width):
+        """Store outline (transformed) as the glyph called name, adding that
+        glyph to the font if it doesn't exist yet."""
+        bounds_pen = BoundsPen(None)
+        outline.replay(TransformPen(bounds_pen, transform))
+        lsb = otRound(bounds_pen.bounds[0]) if bounds_pen.bounds else 0
+
+        if self._cff:
+            cff, top = self._cff
+            charstring_pen = T2CharStringPen(width - top.Private.nominalWidthX, None)
+            pen = charstring_pen
+            if self._reverse:
+                pen = ReverseContourPen(pen)
+            outline.replay(TransformPen(pen, transform))
+            charstring = charstring_pen.getCharString(
+                private=top.Private, globalSubrs=cff.GlobalSubrs)
+            charstrings = top.CharStrings
+            if name in charstrings.charStrings:
+                charstrings.charStringsIndex[charstrings.charStrings[name]] = charstring
+            else:
+                charstrings.charStringsIndex.append(charstring)
+                charstrings.charStrings[name] = len(charstrings.charStringsIndex) - 1
+        else:
+            glyph_pen = TTGlyphPen(None)
+            max_err = self.font['head'].unitsPerEm / 1000.0
+            outline.replay(TransformPen(
+                Cu2QuPen(glyph_pen, max_err, reverse_direction=self._reverse),
+                transform))
+            self.font['glyf'][name] = glyph_pen.glyph()
+
+        self.hmtx[name] = (width, lsb)
+        if name not in self._glyph_names:
+            self._glyph_names.add(name)
+            self.glyph_order.append(name)
+
+    def source_width(self, source_name):
+        return self.source_glyphs[source_name].width * self.scale
+
+    def copy_character_glyph(self, source_name, name):
+        """Copy an individual character from the ligature font, width-correcting
+        it like LigatureCreator.correct_character_width in ligaturize.py."""
+        outline = self.record_outline(source_name)
+        width = self.source_width(source_name)
+        transform = Transform(self.scale, 0, 0, self.scale, 0, 0)
+
+        if otRound(width) != self.emwidth:
+            widthdelta = float(abs(width - self.emwidth)) / self.emwidth
+            if widthdelta >= self.scale_character_glyphs_threshold:
+                # Character is too wide/narrow compared to output font; scale it.
+                xscale = self.scale * self.emwidth / width
+                transform = Transform(xscale, 0, 0, self.scale, 0, 0)
+            else:
+                # Do not scale; just center it in the new advance width.
+                bounds_pen = BoundsPen(None)
+                outline.replay(TransformPen(bounds_pen, transform))
+                if bounds_pen.bounds:
+                    x_min, _, x_max, _ = bounds_pen.bounds
+                    lsb = (x_min + self.emwidth - x_max) / 2
+                    transform = Transform(self.scale, 0, 0, self.scale, lsb - x_min, 0)
+
+        self.set_glyph(name, outline, transform, self.emwidth)
+
+    def copy_ligature_glyph(self, source_name, name):
+        """Copy a ligature from the ligature font, width-correcting it like
+        LigatureCreator.correct_ligature_width in ligaturize.py."""
+        width = self.source_width(source_name)
+        xscale = self.scale
+        if otRound(width) != self.emwidth:
+            xscale = self.scale * self.emwidth / width
+        self.set_glyph(name, self.record_outline(source_name),
+                       Transform(xscale, 0, 0, self.scale, 0, 0), self.emwidth)
+
+    def create_spacer_glyph(self, name):
+        """Create an empty glyph called name, as wide as the space."""
+        self.set_glyph(name, RecordingPen(), Transform(), self.spacewidth)
+
+    def copy_character_glyphs(self, chars):
+        """Copy individual (non-ligature) characters from the ligature font."""
+        if not self.should_copy_character_glyphs:
+            return
+        print("    ...copying %d character glyphs..." % (len(chars)))
+
+        for char in chars:
+            name = self.char_glyphs.get(char)
+            if name and char in self.source_glyphs:
+                self.copy_character_glyph(char, name)
+
+    def add_ligature(self, input_chars, firacode_ligature_name):
+        if firacode_ligature_name is None:
+            # No ligature name -- we're just copying a bunch of individual characters.
+            self.copy_character_glyphs(input_chars)
+            return
+
+        # Ligatures the source font doesn't have were already left out by
+        # resolve_ligatures().
+        # The characters are named as in Fira Code; use whatever glyphs the
+        # output font maps them to instead.
+        glyph_names = [self.char_glyphs.get(char) for char in input_chars]
+        if None in glyph_names:
+            return
+
+        self._lig_counter += 1
+        ligature_name = 'lig.{}'.format(self._lig_counter)
+        self.copy_ligature_glyph(firacode_ligature_name, ligature_name)
+
+        if self.plan.uses_shared_spacer(glyph_names):
+            spacer_names = [self.shared_spacer_glyph()] * (len(input_chars) - 1)
+        else:
+            spacer_names = ['CR.{}.{}'.format(self._lig_counter, i)
+                            for i in range(len(input_chars) - 1)]
+            for spacer_name in spacer_names:
+                self.create_spacer_glyph(spacer_name)
+            self.spacer_glyph_count += len(spacer_names)
+        self.spacer_position_count += len(spacer_names)
+
+        self.plan.add_ligature(self._lig_counter, glyph_names, ligature_name, spacer_names)
+
+    def shared_spacer_glyph(self):
+        """Return the name of the spacer glyph shared by all ligatures, creating
+        it the first time."""
+        if self._shared_spacer_name is None:
+            name = 'LIG'
+            while name in self._glyph_names:
+                name += '.spacer'
+            self.create_spacer_glyph(name)
+            self.spacer_glyph_count += 1
+            self._shared_spacer_name = name
+        return self._shared_spacer_name
+
+    def finish_glyphs(self):
+        """Give the font its new glyph order, once all glyphs have been added."""
+        self.font.setGlyphOrder(self.glyph_order)
+        if self._cff:
+            self._cff[1].charset = list(self.glyph_order)
+
+    def add_lookups(self, feature_file=None):
+        """Add the lookups planned by add_ligature() to the font, in front of
+        its existing ones. If feature_file is given, the feature file source
+        they're built from is also written to it."""
+        fea = self.plan.to_fea()
+        if feature_file:
+            with open(feature_file, 'w') as fd:
+                fd.write(fea)
+
+        # feaLib replaces the font's GSUB rather than adding to it, so build
+        # ours on its own and merge it in afterwards.
+        scratch = TTFont()
+        scratch.setGlyphOrder(self.glyph_order)
+        addOpenTypeFeaturesFromString(scratch, fea, tables=['GSUB'])
+        prepend_gsub(self.font, scratch['GSUB'])
+
+
+def shift_lookup_indices(table, offset):
+    """Add offset to every lookup index that contextual lookups in table use."""
+    if isinstance(table, otTables.SubstLookupRecord):
+        table.LookupListIndex += offset
+    elif isinstance(table, list):
+        for item in table:
+            shift_lookup_indices(item, offset)
+    elif isinstance(table, otTables.BaseTable):
+        for value in vars(table).values():
+            shift_lookup_indices(value, offset)
+
+def new_lang_sys(feature_indices):
+    lang_sys = otTables.LangSys()
+    lang_sys.LookupOrder = None
+    lang_sys.ReqFeatureIndex = 0xFFFF
+    lang_sys.FeatureIndex = list(feature_indices)
+    return lang_sys
+
+def find_lang_sys(script, tag):
+    """Return the LangSys for tag (None for the default one) in script, adding
+    one with the same features as the default if there isn't one."""
+    if tag is None:
+        if script.DefaultLangSys is None:
+            script.DefaultLangSys = new_lang_sys([])
+        return script.DefaultLangSys
+    for record in script.LangSysRecord:
+        if record.LangSysTag == tag:
+            return record.LangSys
+    record = otTables.LangSysRecord()
+    record.LangSysTag = tag
+    record.LangSys = new_lang_sys(
+        script.DefaultLangSys.FeatureIndex if script.DefaultLangSys else [])
+    script.LangSysRecord.append(record)
+    script.LangSysRecord.sort(key=lambda record: record.LangSysTag)
+    return record.LangSys
+
+def add_feature(table, lang_sys, new_record):
+    """Add the lookups of new_record to the feature with the same tag in
+    lang_sys, or if it hasn't got one, add new_record to it.
+
+    Shapers only use the first feature with a given tag, so adding a second
+    'calt' to a font that already has one would have no effect.
+    """
+    records = table.FeatureList.FeatureRecord
+    for index in lang_sys.FeatureIndex:
+        record = records[index]
+        if record.FeatureTag == new_record.FeatureTag:
+            record.Feature.LookupListIndex = sorted(
+                set(record.Feature.LookupListIndex) | set(new_record.Feature.LookupListIndex))
+            return
+    for index, record in enumerate(records):
+        if record is new_record:
+            break
+    else:
+        index = len(records)
+        records.append(new_record)
+    lang_sys.FeatureIndex.append(index)
+
+def prepend_gsub(font, gsub):
+    """Merge the lookups, features and scripts of gsub into the font's GSUB,
+    with gsub's lookups in front of the font's own."""
+    old = font['GSUB'].table if 'GSUB' in font else None
+    if not (old and old.ScriptList and old.FeatureList and old.LookupList):
+        # Nothing worth keeping.
+        font['GSUB'] = gsub
+        return
+    new = gsub.table
+    offset = len(new.LookupList.Lookup)
+
+    shift_lookup_indices(old.LookupList, offset)
+    features = [record.Feature for record in old.FeatureList.FeatureRecord]
+    if getattr(old, 'FeatureVariations', None):
+        features.extend(
+            record.Feature
+            for variation in old.FeatureVariations.FeatureVariationRecord
+            for record in variation.FeatureTableSubstitution.SubstitutionRecord)
+    for feature in features:
+        feature.LookupListIndex = [i + offset for i in feature.LookupListIndex]
+    old.LookupList.Lookup = new.LookupList.Lookup + old.LookupList.Lookup
+
+    scripts = dict((record.ScriptTag, record.Script) for record in old.ScriptList.ScriptRecord)
+    for new_script_record in new.ScriptList.ScriptRecord:
+        script = scripts.get(new_script_record.ScriptTag)
+        if script is None:
+            record = otTables.ScriptRecord()
+            record.ScriptTag = new_script_record.ScriptTag
+            record.Script = script = otTables.Script()
+            script.DefaultLangSys = None
+            script.LangSysRecord = []
+            old.ScriptList.ScriptRecord.append(record)
+            scripts[record.ScriptTag] = script
+        new_script = new_script_record.Script
+        new_lang_systems = [(None, new_script.DefaultLangSys)] + [
+            (record.LangSysTag, record.LangSys) for record in new_script.LangSysRecord]
+        for tag, new_lang_sys in new_lang_systems:
+            if new_lang_sys is None:
+                continue
+            lang_sys = find_lang_sys(script, tag)
+            for index in new_lang_sys.FeatureIndex:
+                add_feature(old, lang_sys, new.FeatureList.FeatureRecord[index])
+    old.ScriptList.ScriptRecord.sort(key=lambda record: record.ScriptTag)
+
+    # A feature variation swaps in other lookups for a feature when its
+    # conditions are met, e.g. at heavier weights, so those need the new
+    # lookups of the feature's tag too.
+    if getattr(old, 'FeatureVariations', None):
+        new_lookups = {}
+        for record in new.FeatureList.FeatureRecord:
+            new_lookups.setdefault(record.FeatureTag, set()).update(
+                record.Feature.LookupListIndex)
+        for variation in old.FeatureVariations.FeatureVariationRecord:
+            for record in variation.FeatureTableSubstitution.SubstitutionRecord:
+                tag = old.FeatureList.FeatureRecord[record.FeatureIndex].FeatureTag
+                record.Feature.LookupListIndex = sorted(
+                    set(record.Feature.LookupListIndex) | new_lookups.get(tag, set()))
+                record.Feature.LookupCount = len(record.Feature.LookupListIndex)
+
+    # Keep the counts in sync with the lists they count.
+    old.LookupList.LookupCount = len(old.LookupList.Lookup)
+    old.FeatureList.FeatureCount = len(old.FeatureList.FeatureRecord)
+    old.ScriptList.ScriptCount = len(old.ScriptList.ScriptRecord)
+    for record in old.FeatureList.FeatureRecord:
+        record.Feature.LookupCount = len(record.Feature.LookupListIndex)
+    for record in old.ScriptList.ScriptRecord:
+        record.Script.LangSysCount = len(record.Script.LangSysRecord)
+        for lang_sys in [record.Script.DefaultLangSys] + [
+                lang_record.LangSys for lang_record in record.Script.LangSysRecord]:
+            if lang_sys:
+                lang_sys.FeatureCount = len(lang_sys.FeatureIndex)
+
+
+def set_name(font, name_id, value, add=False):
+    """Replace every name table record with the given ID; if add is set and
+    there aren't any, add one."""
+    records = [record for record in font['name'].names if record.nameID == name_id]
+    for record in records:
+        record.string = value
+    if add and not records:
+        font['name'].setName(value, name_id, 3, 1, 0x409)
+
+def update_font_metadata(font, input_font_file, new_name):
+    """Rename the font like update_font_metadata in ligaturize.py, and return
+    its new PostScript name."""
+    name_table = font['name']
+    old_name = name_table.getDebugName(1)
+    fontname = name_table.getDebugName(6) or ''
+    # The PostScript names of a variable font's named instances start with
+    # name 25 (or, without one, name 6 less the hyphen).
+    old_prefix = name_table.getDebugName(25) or fontname.replace('-', '')
+    try:
+        suffix = fontname.split('-')[1]
+    except IndexError:
+        suffix = None
+
+    if suffix:
+        fullname = "%s %s" % (new_name, suffix)
+        fontname = "%s-%s" % (new_name.replace(' ', ''), suffix)
+    else:
+        fullname = new_name
+        fontname = new_name.replace(' ', '')
+
+    print("Ligaturizing font %s (%s) as '%s'" % (
+        path.basename(input_font_file), old_name, new_name))
+
+    copyright = name_table.getDebugName(0) or ''
+    set_name(font, 0, copyright + COPYRIGHT, add=True)
+    set_name(font, 1, new_name, add=True)
+    set_name(font, 3, '%s; Ligaturized' % fullname)
+    set_name(font, 4, fullname, add=True)
+    set_name(font, 6, fontname, add=True)
+    set_name(font, 16, new_name)
+    set_name(font, 18, new_name)
+    set_name(font, 21, new_name)
+
+    if 'fvar' in font:
+        new_prefix = fontname.replace('-', '')
+        set_name(font, 25, new_prefix)
+        for instance in font['fvar'].instances:
+            if instance.postscriptNameID != 0xFFFF:
+                name = name_table.getDebugName(instance.postscriptNameID) or ''
+                if name.startswith(old_prefix):
+                    set_name(font, instance.postscriptNameID,
+                             new_prefix + name[len(old_prefix):])
+
+    if 'CFF ' in font:
+        cff = font['CFF '].cff
+        top = cff[cff.fontNames[0]]
+        cff.fontNames[0] = fontname
+        for key, value in [('FamilyName', new_name), ('FullName', fullname)]:
+            if hasattr(top, key):
+                setattr(top, key, value)
+    return fontname
+
+def ligaturize_font(input_font_file, output_dir, ligature_font_file,
+                    output_name, prefix, feature_file=False,
+                    cache_dir=None, outline_cache_size=256, profile=False,
+                    report=False, patch=False, subset_corpus=None,
+                    subset_chars=None, subset_ligatures=None, on_phase=None,
+                    **kwargs):
+    """Ligaturize one font; see ligaturize_font in ligaturize.py.
+
+    Only the ligature plan is cached in cache_dir, not outlines (copying
+    glyphs is cheap here), and no footprint report is written even if report
+    is set, since its checks need fontforge.
+    """
+    if report:
+        print("    ...not writing a footprint report for %s; that needs the"
+              " fontforge engine" % path.basename(input_font_file))
+
+    profiler = Profiler(on_phase) if profile else NullProfiler(on_phase)
+    with profiler.phase('open font'):
+        font = TTFont(input_font_file, lazy=False)
+    variable = 'fvar' in font
+    if variable:
+        import variable_font
+
+    if not ligature_font_file:
+        if variable and path.exists(variable_font.FIRA_VARIABLE):
+            ligature_font_file = variable_font.FIRA_VARIABLE
+        else:
+            ligature_font_file = get_ligature_source(font['name'].getDebugName(6) or '')
+
+    if output_name:
+        name = output_name
+    else:
+        name = font['name'].getDebugName(1)
+    if prefix:
+        name = "%s %s" % (prefix, name)
+
+    with profiler.phase('update metadata'):
+        fontname = update_font_metadata(font, input_font_file, name)
+
+    # Generate font type (TTF or OTF) corresponding to input font extension
+    # (defaults to TTF)
+    if input_font_file[-4:].lower() == '.otf':
+        output_font_type = '.otf'
+    else:
+        output_font_type = '.ttf'
+    output_font_file = path.join(output_dir, fontname + output_font_type)
+
+    with profiler.phase('open ligature source'):
+        if variable:
+            source = variable_font.open_variable_source(ligature_font_file)
+        else:
+            source = open_ligature_source(ligature_font_file)
+    print('    ...using ligatures from %s (source cache: %d hits, %d misses)' % (
+        ligature_font_file, _ligature_source_stats['hits'],
+        _ligature_source_stats['misses']))
+    with profiler.phase('resolve ligatures'):
+        resolved = resolve_ligatures(
+            ligature_font_file,
+            (source.font if variable else source).getGlyphOrder, cache_dir)
+    if resolved.missing:
+        print('    ...skipping %d ligatures not in %s' % (len(resolved.missing), ligature_font_file))
+    planned = resolved.ligatures
+    subset = None
+    if subset_corpus or subset_chars or subset_ligatures:
+        with profiler.phase('scan subset text'):
+            subset = web_subset(subset_corpus, subset_chars, subset_ligatures)
+        planned = [lig for lig in planned if subset.keeps(lig)]
+
+    with profiler.phase('set up'):
+        if variable:
+            creator = variable_font.VariableLigatureCreator(font, source, **kwargs)
+            if source.axis is None:
+                print("    ...WARNING: %s isn't a variable font, so the ligatures"
+                      " will look the same at every weight" % ligature_font_file)
+            print('    ...variable font: copying glyphs at %d weights' % len(creator.breakpoints))
+        else:
+            creator = LigatureCreator(font, source, **kwargs)
+    with profiler.phase('add ligatures'):
+        for lig_spec in planned:
+            try:
+                with profiler.ligature(lig_spec['chars'], lig_spec['firacode_ligature_name']):
+                    creator.add_ligature(lig_spec['chars'], lig_spec['firacode_ligature_name'])
+            except Exception:
+                print('Exception while adding ligature: {}'.format(lig_spec))
+                raise
+        creator.finish_glyphs()
+    if feature_file:
+        feature_file = output_font_file + '.fea'
+    with profiler.phase('add lookups'):
+        creator.add_lookups(feature_file)
+    print('    ...added %d ligatures, using %d spacer glyphs for %d spacer positions' % (
+        creator._lig_counter, creator.spacer_glyph_count, creator.spacer_position_count))
+    if creator.plan.minimal_rules:
+        print('    ...%s' % creator.plan.rule_summary())
+    if variable and creator.static_glyph_count:
+        print('    ...WARNING: %d glyphs had incompatible outlines at different weights'
+              ' and will look the same at every weight' % creator.static_glyph_count)
+
+    print("    ...saving to '%s' (%s)" % (output_font_file, name))
+    with profiler.phase('generate'):
+        if not (patch and patch_font(input_font_file, font, output_font_file)):
+            drop_stale_tables(font)
+            font.save(output_font_file)
+    font.close()
+
+    subset_file = woff2_file = None
+    if subset:
+        with profiler.phase('subset'):
+            subset_file, woff2_file = subset_font(output_font_file, subset)
+        print("    ...subset to %s, and saved as '%s' and '%s'" % (
+            subset.describe(), subset_file, woff2_file))
+
+    profile_file = None
+    if profile:
+        profile_file = output_font_file + '.profile.json'
+        profiler.print_summary()
+        profiler.write_report(profile_file)
+    return {
+        'output_font_file': output_font_file,
+        'ligature_font_file': ligature_font_file,
+        'feature_file': feature_file or None,
+        'profile_file': profile_file,
+        'report_file': None,
+        'subset_file': subset_file,
+        'woff2_file': woff2_file,
+        'font_name': name,
+        'ligatures_added': creator._lig_counter,
+        'ligatures_skipped': len(resolved.missing) + len([
+            lig for lig in resolved.ligatures if lig['firacode_ligature_name']])
+            - creator._lig_counter,
+    }
+
+def main():
+    import ligaturize
+    ligaturize.main(['--engine=fonttools'] + sys.argv[1:])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+#
+# Footprint reports for ligaturize.py --report: how much bigger ligaturizing
+# made a font, table by table, and whether everything that was planned actually
+# made it into the generated file.
+
+try:
+    import fontforge
+except ImportError:
+    # Only table_sizes() and is_variable_font() work without it.
+    fontforge = None
+import struct
+from os import path
+
+# The tables most affected by ligaturizing, which are printed in the summary.
+# (The report itself has all of them.)
+SUMMARY_TABLES = ['GSUB', 'glyf', 'loca', 'CFF ', 'hmtx', 'post']
+
+# The tags a single TrueType or OpenType font file starts with.
+SFNT_TAGS = [b'\x00\x01\x00\x00', b'OTTO', b'true']
+
+def table_sizes(font_file):
+    """Read the table directory of an OpenType font and return the size of
+    each table in bytes, by tag."""
+    with open(font_file, 'rb') as fd:
+        header = fd.read(12)
+        if len(header) < 12:
+            raise ValueError('%s is not an OpenType font' % font_file)
+        num_tables = struct.unpack('>H', header[4:6])[0]
+        directory = fd.read(16 * num_tables)
+    sizes = {}
+    for i in range(num_tables):
+        tag, _, _, length = struct.unpack('>4sLLL', directory[16 * i:16 * (i + 1)])
+        sizes[tag.decode('latin-1')] = length
+    return sizes
+
+def is_variable_font(font_file):
+    """Whether font_file is a TrueType or OpenType font with an fvar table.
+    Anything else fontforge can open (.sfd, UFO directories, font collections,
+    WOFF) counts as static."""
+    if not path.isfile(font_file):
+        return False
+    with open(font_file, 'rb') as fd:
+        if fd.read(4) not in SFNT_TAGS:
+            return False
+    try:
+        return 'fvar' in table_sizes(font_file)
+    except (ValueError, struct.error):
+        # Truncated; let fontforge make what it can of it.
+        return False
+
+def gsub_summary(font):
+    """Count a font's glyphs, GSUB lookups, calt lookups and calt subtables."""
+    calt_lookups = [
+        lookup for lookup in font.gsub_lookups
+        if any(feature == 'calt' for feature, _ in font.getLookupInfo(lookup)[2])]
+    return {
+        'glyphs': len(list(font.glyphs())),
+        'lookups': len(font.gsub_lookups),
+        'calt_lookups': len(calt_lookups),
+        'calt_subtables': sum(
+            len(font.getLookupSubtables(lookup)) for lookup in calt_lookups),
+    }
+
+def footprint_report(input_font_file, output_font_file, before, plan,
+                     one_subtable_per_rule):
+    """Compare output_font_file with input_font_file, and check that it
+    contains everything in plan (a GsubPlan).
+
+    before is the gsub_summary() of the input font. If one_subtable_per_rule
+    is set, every calt rule is expected to be in a subtable of its own; if
+    not, only the calt lookups themselves are checked.
+    """
+    tables_before = table_sizes(input_font_file)
+    tables_after = table_sizes(output_font_file)
+    tables = dict(
+        (tag, {'before': tables_before.get(tag, 0), 'after': tables_after.get(tag, 0)})
+        for tag in set(tables_before) | set(tables_after))
+
+    output = fontforge.open(output_font_file)
+    try:
+        after = gsub_summary(output)
+        expected_glyphs = sorted(set(
+            replacement
+            for lookup in plan.single_lookups
+            for _, replacement in lookup.mapping))
+        missing_glyphs = [name for name in expected_glyphs if name not in output]
+    finally:
+        output.close()
+
+    calt_lookups = plan.calt_lookups()
+    checks = {
+        'missing_glyphs': missing_glyphs,
+        'calt_lookups': {
+            'expected': len(calt_lookups),
+            'found': after['calt_lookups'] - before['calt_lookups'],
+        },
+    }
+    if one_subtable_per_rule:
+        checks['calt_subtables'] = {
+            'expected': sum(len(rules) for _, rules in calt_lookups),
+            'found': after['calt_subtables'] - before['calt_subtables'],
+        }
+    ok = not missing_glyphs and all(
+        check['expected'] == check['found']
+        for name, check in checks.items() if name != 'missing_glyphs')
+
+    return {
+        'input_font_file': input_font_file,
+        'output_font_file': output_font_file,
+        'file_size': {
+            'before': path.getsize(input_font_file),
+            'after': path.getsize(output_font_file),
+        },
+        'tables': tables,
+        'glyphs_added': after['glyphs'] - before['glyphs'],
+        'lookups_added': after['lookups'] - before['lookups'],
+        'checks': checks,
+        'ok': ok,
+    }
+
+def format_size_change(before, after):
+    return '%d -> %d (%+d)' % (before, after, after - before)
+
+def print_report(report):
+    print('    ...footprint: %s bytes, %d glyphs and %d lookups added' % (
+        format_size_change(report['file_size']['before'], report['file_size']['after']),
+        report['glyphs_added'], report['lookups_added']))
+    for tag in SUMMARY_TABLES:
+        if tag in report['tables']:
+            sizes = report['tables'][tag]
+            print('        %-4s %s' % (tag, format_size_change(sizes['before'], sizes['after'])))
+    checks = report['checks']
+    if checks['missing_glyphs']:
+        print('    ...ERROR: missing ligature glyphs: %s' % ' '.join(checks['missing_glyphs']))
+    for name, check in sorted(checks.items()):
+        if name != 'missing_glyphs' and check['expected'] != check['found']:
+            print('    ...ERROR: expected %d %s, found %d' % (
+                check['expected'], name.replace('_', ' '), check['found']))
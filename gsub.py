@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+#
+# Plans the GSUB lookups that ligaturize.py adds to a font: which single
+# substitutions replace each character of a ligature, and which contextual
+# (calt) rules trigger them. Nothing in here depends on fontforge; the planned
+# lookups are turned into real ones by LigatureCreator.
+
+from collections import namedtuple
+
+# The scripts and languages the calt lookups are registered for.
+CALT_SCRIPTS = (
+    ('DFLT', ('dflt',)),
+    ('arab', ('dflt',)),
+    ('armn', ('dflt',)),
+    ('cyrl', ('SRB ', 'dflt')),
+    ('geor', ('dflt',)),
+    ('grek', ('dflt',)),
+    ('lao ', ('dflt',)),
+    ('latn', ('CAT ', 'ESP ', 'GAL ', 'ISM ', 'KSM ', 'LSM ', 'MOL ', 'NSM ', 'ROM ', 'SKS ', 'SSM ', 'dflt')),
+    ('math', ('dflt',)),
+    ('thai', ('dflt',)),
+)
+
+# A single substitution lookup; mapping is a list of (glyph, replacement).
+SingleLookup = namedtuple('SingleLookup', 'name subtable mapping')
+
+# One chaining contextual rule, matching a single input glyph. lookup is the
+# single substitution lookup to apply to it, or None for an ignore rule.
+Rule = namedtuple('Rule', 'name backtrack input lookup lookahead')
+
+# A planned ligature: the glyphs it replaces, the spacer glyphs that replace
+# all but the last of them, and the single substitution lookups that do so.
+PlannedLigature = namedtuple('PlannedLigature', 'index chars spacers lookups')
+
+
+def occurs_in(needle, haystack):
+    """Whether the sequence needle occurs anywhere in the sequence haystack."""
+    return any(
+        haystack[i:i + len(needle)] == needle
+        for i in range(len(haystack) - len(needle) + 1))
+
+def can_overlap(a, b):
+    """Whether occurrences of glyph sequences a and b can overlap in text.
+
+    That's the case if one contains the other, or if a suffix of one is a
+    prefix of the other.
+    """
+    if occurs_in(a, b) or occurs_in(b, a):
+        return True
+    return any(
+        a[-n:] == b[:n] or b[-n:] == a[:n]
+        for n in range(1, min(len(a), len(b))))
+
+def shadows(rule, other):
+    """Whether rule matches everywhere other does, so that a shaper trying
+    rule first never gets to other."""
+    return (rule.input == other.input
+            and len(rule.backtrack) <= len(other.backtrack)
+            and tuple(other.backtrack[len(other.backtrack) - len(rule.backtrack):])
+                == tuple(rule.backtrack)
+            and tuple(other.lookahead[:len(rule.lookahead)]) == tuple(rule.lookahead))
+
+def remove_shadowed_rules(rules):
+    """Drop the rules that an earlier rule in the same lookup shadows."""
+    kept = []
+    for rule in rules:
+        if not any(shadows(earlier, rule) for earlier in kept):
+            kept.append(rule)
+    return kept
+
+def count_rules(calt_lookups):
+    """Return the number of rules in calt_lookups, and of the glyphs they
+    match (backtrack, input and lookahead)."""
+    rules = [rule for _, lookup_rules in calt_lookups for rule in lookup_rules]
+    return len(rules), sum(
+        len(rule.backtrack) + 1 + len(rule.lookahead) for rule in rules)
+
+def can_stop_partway(chars):
+    """Whether the calt rules for a ligature can replace its first characters
+    with spacers and then leave the rest as they are.
+
+    The ignore rule that keeps a ligature from forming in the middle of a
+    longer run is meant for its first character, but it also matches a later
+    one that is the same, if what follows looks like the ligature again: the
+    last '>' of '>=>' in '>=>=>>'. That can only happen where a suffix of the
+    ligature is also a prefix, and the text after the ligature can make the
+    rule match there without it having matched at the start. The spacers left
+    behind mustn't be taken for another ligature's.
+    """
+    chars = tuple(chars)
+    n = len(chars)
+    # The ignore rule matches chars plus the last character once more.
+    run = chars + chars[-1:]
+    return any(chars[k:] == chars[:n - k] and run[n - k] != chars[-1]
+               for k in range(1, n))
+
+def can_interfere(a, b):
+    """Whether the calt rules for ligatures a and b can interfere when they
+    share a lookup and both use the shared spacer glyph.
+
+    The rules for the later characters of a ligature only check that they're
+    preceded by spacers, not by which ligature's spacers, so it's not enough
+    for a and b not to overlap; no tail of either may overlap the other.
+    """
+    return (any(can_overlap(a, b[i:]) for i in range(len(b)))
+            or any(can_overlap(b, a[i:]) for i in range(len(a))))
+
+
+class GsubPlan(object):
+    """The lookups needed to turn sequences of glyphs into ligatures.
+
+    Every ligature gets one single substitution lookup per input glyph, which
+    replaces it with a spacer glyph (or, for the last one, the ligature glyph),
+    and a set of calt rules that apply those substitutions in sequence. By
+    default each ligature's calt rules get a lookup of their own; with
+    merge_lookups, ligatures that can never overlap in text share lookups.
+
+    With shared_spacer, every ligature uses the same spacer glyph, so a single
+    lookup replaces all non-final characters with it. The exception is the
+    few ligatures that can stop partway (see can_stop_partway()), which keep
+    their own spacers, so that no spacers the shared rules would accept are
+    ever left behind.
+
+    With minimal_rules, each rule only checks as much context as it needs to
+    tell where it applies, and rules that an earlier rule in the same lookup
+    always pre-empts are left out; see ligature_rules(). The rules still match
+    in exactly the same places.
+    """
+
+    def __init__(self, merge_lookups=False, shared_spacer=False, minimal_rules=False):
+        self.merge_lookups = merge_lookups
+        self.shared_spacer = shared_spacer
+        self.minimal_rules = minimal_rules
+        self.single_lookups = []
+        self._spacer_lookup = None
+        # In the order they were added, which is shortest first.
+        self._ligatures = []
+
+    def uses_shared_spacer(self, chars):
+        """Whether the ligature for chars should use the shared spacer glyph.
+
+        Ligatures that can stop partway get spacers of their own even with
+        shared_spacer; see can_stop_partway().
+        """
+        return self.shared_spacer and not can_stop_partway(chars)
+
+    def add_ligature(self, index, chars, ligature_glyph, spacer_glyphs):
+        """Plan the substitution of the glyphs in chars by ligature_glyph.
+
+        spacer_glyphs are the glyphs replacing all but the last of chars (if
+        uses_shared_spacer(chars), they must all be the shared spacer glyph);
+        index is used to give the ligature's lookups and rules unique names.
+        """
+        chars = tuple(chars)
+        spacer_glyphs = tuple(spacer_glyphs)
+        replacements = spacer_glyphs + (ligature_glyph,)
+        shared = self.uses_shared_spacer(chars)
+        lookup_names = tuple(
+            self._single_lookup('{}.{}'.format(index, i), char, replacements[i],
+                                is_shared_spacer=shared and i < len(chars) - 1)
+            for i, char in enumerate(chars))
+        self._ligatures.append(PlannedLigature(index, chars, spacer_glyphs, lookup_names))
+
+    def ligature_rules(self, lig, minimal):
+        """Return the calt rules for a PlannedLigature, in the order a shaper
+        tries them.
+
+        The rule for the first character checks that all the others follow;
+        the rules for the others, that the spacers before them do. With
+        minimal, and one set of spacer glyphs per ligature, the latter only
+        check the spacer right before them: it can only be there if the rule
+        for the first character matched, and the characters after it haven't
+        been replaced since. (The shared spacer can come from other ligatures,
+        so the rules of ligatures that use it are kept whole.)
+        """
+        chars, spacers = lig.chars, lig.spacers
+        rule_name = lambda i: 'calt.{}.{}'.format(lig.index, i)
+        rules = []
+        for i, char in enumerate(chars):
+            if minimal and i > 0 and not self.uses_shared_spacer(chars):
+                backtrack, lookahead = spacers[i-1:i], ()
+            else:
+                backtrack, lookahead = spacers[:i], chars[i+1:]
+            rules.append(Rule(rule_name(i), backtrack, char, lig.lookups[i], lookahead))
+        # Don't form the ligature in the middle of a longer run of the same
+        # characters, e.g. the first two '=' of '==='.
+        rules.append(Rule(rule_name(len(chars)),
+            (), chars[0], None, chars[1:] + chars[-1:]))
+        # Only the rule for the first character can match right after an
+        # unreplaced character, and it checks the rest itself.
+        rules.append(Rule(rule_name(len(chars) + 1),
+            chars[:1], chars[0], None, () if minimal else chars[1:]))
+        # The shaper tries them last-added-first.
+        rules.reverse()
+        return rules
+
+    def _single_lookup(self, suffix, glyph, replacement, is_shared_spacer):
+        """Plan the substitution of glyph by replacement, and return the name
+        of the lookup that does it."""
+        if is_shared_spacer:
+            if self._spacer_lookup is None:
+                self._spacer_lookup = SingleLookup('lookup.spacer', 'lookup.sub.spacer', [])
+                self.single_lookups.append(self._spacer_lookup)
+            if (glyph, replacement) not in self._spacer_lookup.mapping:
+                self._spacer_lookup.mapping.append((glyph, replacement))
+            return self._spacer_lookup.name
+
+        name = 'lookup.' + suffix
+        self.single_lookups.append(
+            SingleLookup(name, 'lookup.sub.' + suffix, [(glyph, replacement)]))
+        return name
+
+    def calt_lookups(self, minimal=None):
+        """Return the calt lookups as (name, rules) pairs.
+
+        Both the lookups and the rules in each lookup are in the order the
+        shaper applies them: lookups for longer ligatures come first, so that
+        e.g. '<<=' wins over '<<'.
+
+        minimal defaults to the plan's minimal_rules.
+        """
+        if minimal is None:
+            minimal = self.minimal_rules
+        lookups = [
+            (name, [rule for lig in ligatures for rule in self.ligature_rules(lig, minimal)])
+            for name, ligatures in self._group_ligatures()]
+        if minimal:
+            lookups = [(name, remove_shadowed_rules(rules)) for name, rules in lookups]
+        return lookups
+
+    def rule_counts(self):
+        """Return ((rules, context glyphs) without minimal_rules, (rules,
+        context glyphs) with it)."""
+        return (count_rules(self.calt_lookups(minimal=False)),
+                count_rules(self.calt_lookups(minimal=True)))
+
+    def rule_summary(self):
+        (rules, glyphs), (minimal_rules, minimal_glyphs) = self.rule_counts()
+        return '%d calt rules matching %d glyphs, down from %d rules and %d glyphs' % (
+            minimal_rules, minimal_glyphs, rules, glyphs)
+
+    def _group_ligatures(self):
+        """Return the calt lookups as (name, ligatures) pairs."""
+        ligatures = list(reversed(self._ligatures))
+        if not self.merge_lookups:
+            return [('calt.{}'.format(lig.index), [lig]) for lig in ligatures]
+
+        # A shaper applies each lookup to the whole run of glyphs before moving
+        # on to the next one; within a lookup, the first rule that matches at
+        # each position wins. So two ligatures can share a lookup only if they
+        # can never overlap; otherwise the one that would have been applied
+        # first must stay in an earlier lookup.
+        # Ligatures that both use the shared spacer must be kept further
+        # apart; see can_interfere().
+        def interferes(a, b):
+            if self.uses_shared_spacer(a) and self.uses_shared_spacer(b):
+                return can_interfere(a, b)
+            return can_overlap(a, b)
+        levels = []
+        for i, lig in enumerate(ligatures):
+            levels.append(max([0] + [
+                levels[j] + 1 for j in range(i)
+                if interferes(ligatures[j].chars, lig.chars)]))
+
+        lookups = [('calt.merged.{}'.format(level), [])
+                   for level in range(max(levels or [-1]) + 1)]
+        for level, lig in zip(levels, ligatures):
+            lookups[level][1].append(lig)
+        return lookups
+
+    def to_fea(self):
+        """Return all the planned lookups as OpenType feature file source."""
+        lines = [
+            '# Generated by ligaturize.py from ligatures.py.',
+            '',
+        ]
+        for script, languages in CALT_SCRIPTS:
+            for language in languages:
+                lines.append('languagesystem %s %s;' % (script.strip(), language.strip()))
+        lines.append('')
+
+        for lookup in self.single_lookups:
+            lines.append('lookup %s {' % lookup.name)
+            for glyph, replacement in lookup.mapping:
+                lines.append('    sub %s by %s;' % (glyph, replacement))
+            lines.append('} %s;' % lookup.name)
+            lines.append('')
+
+        calt_lookups = self.calt_lookups()
+        for name, rules in calt_lookups:
+            lines.append('lookup %s {' % name)
+            lines.extend('    %s' % rule_to_fea(rule) for rule in rules)
+            lines.append('} %s;' % name)
+            lines.append('')
+
+        lines.append('feature calt {')
+        lines.extend('    lookup %s;' % name for name, _ in calt_lookups)
+        lines.append('} calt;')
+        return '\n'.join(lines) + '\n'
+
+def rule_to_fea(rule):
+    """Format a Rule as a feature file chaining contextual substitution."""
+    if rule.lookup:
+        marked = "%s' lookup %s" % (rule.input, rule.lookup)
+        statement = 'sub'
+    else:
+        marked = "%s'" % rule.input
+        statement = 'ignore sub'
+    return '%s;' % ' '.join(
+        [statement] + list(rule.backtrack) + [marked] + list(rule.lookahead))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#
+# Progress events for build.py and ligaturize.py --log-format=jsonl.
+#
+# With --log-format=jsonl, stdout is a stream of JSON objects, one per line:
+# an event when a font is started, when it's through each phase of
+# ligaturizing (see Profiler.phase) and when it's done or has failed, and, from
+# build.py, a summary at the end. Everything meant for people goes to stderr
+# instead. What fontforge writes to stderr while a font is being ligaturized
+# (warnings like "This contextual rule applies no lookups.") is captured and
+# counted per font, rather than mixed in with the output. So is the peak
+# resident memory use of ligaturizing each font.
+
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+LOG_FORMATS = ['text', 'jsonl']
+
+# How many different lines from stderr to show per font with the text format.
+SHOWN_WARNINGS = 5
+
+
+class EventLog(object):
+    """Writes events to stdout as JSON lines, if log_format is 'jsonl'."""
+
+    def __init__(self, log_format='text'):
+        self.enabled = log_format == 'jsonl'
+        # Keep our own copy of stdout, so that events still get there while
+        # stdout itself is pointed elsewhere (see quiet_stdout()).
+        self._fd = os.dup(1) if self.enabled else None
+
+    def claim_stdout(self):
+        """Leave stdout to events: send everything else written to it, by this
+        process and those it starts, to stderr."""
+        if self.enabled:
+            sys.stdout.flush()
+            os.dup2(2, 1)
+
+    def event(self, event, **fields):
+        if not self.enabled:
+            return
+        fields.update(event=event, time=round(time.time(), 3), pid=os.getpid())
+        # One write per event, so that lines from worker processes sharing
+        # stdout don't get mixed up.
+        os.write(self._fd, (json.dumps(fields, sort_keys=True) + '\n').encode('utf-8'))
+
+# Event logs by format, one of each per process.
+_event_logs = {}
+
+def event_log(log_format):
+    if log_format not in _event_logs:
+        _event_logs[log_format] = EventLog(log_format)
+    return _event_logs[log_format]
+
+def proc_status(field):
+    """A memory size from /proc/self/status (Linux only), in bytes, or None."""
+    try:
+        with open('/proc/self/status') as fd:
+            for line in fd:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+def reset_peak_rss():
+    """Start measuring peak_rss() afresh, where the OS allows it (Linux)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as fd:
+            fd.write('5')
+    except (IOError, OSError):
+        pass
+
+def peak_rss():
+    """Peak resident memory use in bytes since reset_peak_rss() or, where
+    that can't be reset, since the process started."""
+    peak = proc_status('VmHWM')
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes, except on macOS.
+        if sys.platform != 'darwin':
+            peak *= 1024
+    return peak
+
+def current_rss():
+    """Resident memory use in bytes right now (or, off Linux, the peak)."""
+    rss = proc_status('VmRSS')
+    return peak_rss() if rss is None else rss
+
+@contextmanager
+def redirected_fd(fd, target_fd):
+    """Point file descriptor fd at target_fd for the body of a with statement."""
+    for stream in [sys.stdout, sys.stderr]:
+        stream.flush()
+    saved = os.dup(fd)
+    os.dup2(target_fd, fd)
+    try:
+        yield
+    finally:
+        for stream in [sys.stdout, sys.stderr]:
+            stream.flush()
+        os.dup2(saved, fd)
+        os.close(saved)
+
+@contextmanager
+def captured_stderr():
+    """Capture everything written to stderr, by Python or by fontforge, in the
+    body of a with statement. Yields a list that then gets the lines."""
+    lines = []
+    with tempfile.TemporaryFile() as capture:
+        try:
+            with redirected_fd(2, capture.fileno()):
+                yield lines
+        finally:
+            capture.seek(0)
+            lines.extend(capture.read().decode('utf-8', 'replace').splitlines())
+
+@contextmanager
+def quiet_stdout():
+    """Discard everything written to stdout in the body of a with statement."""
+    with open(os.devnull, 'w') as devnull:
+        with redirected_fd(1, devnull.fileno()):
+            yield
+
+def count_lines(lines):
+    """Return {line: how often it occurs} for the non-blank lines."""
+    return dict(Counter(line.strip() for line in lines if line.strip()))
+
+def run_logged(log, ligaturize_font, job):
+    """Call ligaturize_font(**job) with stderr captured, logging its start,
+    phases and outcome to log.
+
+    Returns (result, error, warnings, peak_rss): the result of
+    ligaturize_font() or None, the traceback if it failed or None, {line:
+    count} for what was written to stderr, and the peak resident memory use in
+    bytes while it ran. With a text log, the commentary ligaturize_font()
+    prints is left alone and the warnings and memory use are printed after it.
+    """
+    input_font_file = job['input_font_file']
+    log.event('start', input_font_file=input_font_file)
+    kwargs = dict(job)
+    if log.enabled:
+        kwargs['on_phase'] = lambda phase, seconds: log.event(
+            'phase', input_font_file=input_font_file, phase=phase,
+            seconds=round(seconds, 4))
+
+    result = error = None
+    start = time.time()
+    reset_peak_rss()
+    with captured_stderr() as lines:
+        try:
+            if log.enabled:
+                # The events take the place of the commentary.
+                with quiet_stdout():
+                    result = ligaturize_font(**kwargs)
+            else:
+                result = ligaturize_font(**kwargs)
+        except Exception:
+            error = traceback.format_exc()
+    seconds = time.time() - start
+    peak = peak_rss()
+    warnings = count_lines(lines)
+
+    if not log.enabled and warnings:
+        print('    ...%d lines on stderr:' % sum(warnings.values()))
+        common = sorted(warnings.items(), key=lambda item: -item[1])
+        for line, count in common[:SHOWN_WARNINGS]:
+            print('        %6d x %s' % (count, line))
+        if len(common) > SHOWN_WARNINGS:
+            print('        ...and %d other lines' % sum(
+                count for _, count in common[SHOWN_WARNINGS:]))
+    if not log.enabled and not error:
+        print('    ...peak memory use: %.1f MB' % (peak / 1048576.0))
+    if error:
+        log.event('failed', input_font_file=input_font_file, seconds=round(seconds, 4),
+                  error=error, warnings=warnings, peak_rss=peak)
+    else:
+        log.event('done', input_font_file=input_font_file, seconds=round(seconds, 4),
+                  warnings=warnings, warning_count=sum(warnings.values()), peak_rss=peak,
+                  **dict((key, result.get(key)) for key in [
+                      'output_font_file', 'font_name', 'ligature_font_file',
+                      'ligatures_added', 'ligatures_skipped']))
+    return result, error, warnings, peak
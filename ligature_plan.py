@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#
+# Checking the ligature table, and resolving it against a ligature source font.
+#
+# ligatures.py is edited by hand -- ligatures are turned on and off by
+# commenting them out -- so before anything is ligaturized it's checked for
+# mistakes that would otherwise go unnoticed: duplicate keys in an entry (the
+# last one silently wins), two entries for the same characters (only one of
+# them can ever apply), two entries for the same ligature glyph, and character
+# names that aren't in char_dict.py.
+#
+# The resolved plan is the table in the order ligatures are added (shortest
+# first), without the ligatures the source font doesn't have. Resolving it
+# reads the source font's glyph names once, rather than looking up every
+# ligature in the font; with a cache directory, the result is stored under
+# the hash of the source font, so later runs don't look anything up at all.
+
+import ast
+from collections import namedtuple
+from os import path
+
+from char_dict import char_dict
+from ligatures import ligatures
+from outline_cache import OutlineCache
+
+LIGATURES_FILE = path.join(path.dirname(path.abspath(__file__)), 'ligatures.py')
+
+# The keys every entry in the ligature table has.
+KEYS = ['chars', 'firacode_ligature_name']
+
+# Resolved plans are tiny; this is plenty for every ligature source there is.
+PLAN_CACHE_SIZE = 1 << 20
+
+# ligatures: the entries to add, in order. missing: the names of the
+# ligature glyphs the source font doesn't have.
+ResolvedLigatures = namedtuple('ResolvedLigatures', 'ligatures missing')
+
+def entry_lines(source_file=LIGATURES_FILE):
+    """Return the line number of each entry in the ligature table, and a list
+    of the problems that can only be seen in its source: duplicate keys."""
+    with open(source_file) as fd:
+        tree = ast.parse(fd.read(), source_file)
+    table = [node.value for node in tree.body
+             if isinstance(node, ast.Assign) and
+             [getattr(target, 'id', None) for target in node.targets] == ['ligatures']]
+    if not table or not isinstance(table[-1], ast.List):
+        return [], []
+
+    lines, problems = [], []
+    for entry in table[-1].elts:
+        lines.append(entry.lineno)
+        if not isinstance(entry, ast.Dict):
+            continue
+        keys = [key.value for key in entry.keys if isinstance(key, ast.Constant)]
+        for key in sorted(set(keys)):
+            if keys.count(key) > 1:
+                problems.append('line %d: %r is given %d times; only the last one is used' % (
+                    entry.lineno, key, keys.count(key)))
+    return lines, problems
+
+def check_ligatures(table=ligatures, source_file=LIGATURES_FILE):
+    """Return a list of the problems with the ligature table; empty if
+    there are none."""
+    lines, problems = entry_lines(source_file)
+    if len(lines) != len(table):
+        # Not the table in source_file (or not a plain list literal), so
+        # there are no line numbers to go by.
+        lines = None
+    where = lambda i: 'line %d' % lines[i] if lines else 'entry %d' % (i + 1)
+
+    first_chars, first_name = {}, {}
+    for i, lig in enumerate(table):
+        if not isinstance(lig, dict) or sorted(lig) != sorted(KEYS):
+            problems.append('%s: expected the keys %s' % (where(i), ', '.join(KEYS)))
+            continue
+        chars, name = tuple(lig['chars']), lig['firacode_ligature_name']
+        unknown = [char for char in chars if char not in char_dict]
+        if unknown:
+            problems.append('%s: %s not in char_dict.py' % (where(i), ', '.join(unknown)))
+        if name is None:
+            # Individual characters to copy, not a ligature.
+            continue
+        if chars in first_chars:
+            problems.append('%s: %s shadowed by the ligature for the same characters on %s' % (
+                where(i), name, where(first_chars[chars])))
+        else:
+            first_chars[chars] = i
+        if name in first_name:
+            problems.append('%s: %s is already used for %s on %s' % (
+                where(i), name, ' '.join(table[first_name[name]]['chars']),
+                where(first_name[name])))
+        else:
+            first_name[name] = i
+    return problems
+
+_checked = []
+
+def validate_ligatures():
+    """Raise ValueError if the ligature table has any problems. Only checks
+    once per process."""
+    if not _checked:
+        problems = check_ligatures()
+        if problems:
+            raise ValueError('Problems in %s:\n    %s' % (
+                LIGATURES_FILE, '\n    '.join(problems)))
+        _checked.append(True)
+
+# Resolved plans, keyed by ligature source path.
+_resolved = {}
+
+def resolve_ligatures(ligature_font_file, glyph_names, cache_dir=None):
+    """Return the ResolvedLigatures for a ligature source font.
+
+    glyph_names is called to get the names of the glyphs in the source font
+    if the plan isn't cached yet, in this process or (if cache_dir is set) in
+    cache_dir/plans.
+    """
+    validate_ligatures()
+    if ligature_font_file in _resolved:
+        return _resolved[ligature_font_file]
+
+    cache = key = None
+    if cache_dir:
+        cache = OutlineCache(path.join(cache_dir, 'plans'), PLAN_CACHE_SIZE)
+        key = cache.key(cache.source_digest(ligature_font_file), ligatures)
+        entries = cache.load(key)
+        if entries:
+            _resolved[ligature_font_file] = ResolvedLigatures(**entries)
+            return _resolved[ligature_font_file]
+
+    names = set(glyph_names())
+    resolved = ResolvedLigatures(
+        [lig for lig in sorted(ligatures, key=lambda lig: len(lig['chars']))
+         if lig['firacode_ligature_name'] in names or lig['firacode_ligature_name'] is None],
+        sorted(lig['firacode_ligature_name'] for lig in ligatures
+               if lig['firacode_ligature_name'] not in names and
+               lig['firacode_ligature_name'] is not None))
+    if cache:
+        cache.store(key, resolved._asdict())
+    _resolved[ligature_font_file] = resolved
+    return resolved
@@ -1,20 +1,34 @@
 #!/usr/bin/env python
 #
-# usage: fontforge -lang=py ligaturize.py [options]
+# usage: fontforge -lang=py ligaturize.py [options] <font>...
 # Run with --help for detailed options, or use the `build.py` script to
 # process lots of fonts at once.
 #
 # See ligatures.py for a list of all the ligatures (and, optionally, individual
 # characters) that will be copied.
 
-import fontforge
-import psMat
+try:
+    import fontforge
+    import psMat
+except ImportError:
+    # Only the fonttools engine (see fonttools_engine.py) can be used.
+    fontforge = None
+from fnmatch import fnmatch
+from glob import glob
+from importlib.util import find_spec
+import json
 import os
 from os import path
 import sys
 
-from ligatures import ligatures
 from char_dict import char_dict
+from gsub import CALT_SCRIPTS, GsubPlan
+from ligature_plan import resolve_ligatures
+from webfont import subset_font, web_subset
+from footprint import footprint_report, gsub_summary, is_variable_font, print_report
+from outline_cache import OutlineCache
+from profiling import NullProfiler, Profiler
+from joblog import LOG_FORMATS, event_log, run_logged
 
 # Constants
 COPYRIGHT = '''
@@ -35,29 +49,157 @@ def get_ligature_source(fontname):
         return 'fonts/fira/distr/otf/FiraCode-Bold.otf'
     return 'fonts/fira/distr/otf/FiraCode-Regular.otf'
 
+# Ligature source fonts we've already opened, keyed by (path, em). Setting
+# .em on a font rescales every glyph in it, so rather than rescaling a shared
+# copy back and forth (and accumulating rounding errors) we keep one copy per
+# em size.
+_ligature_sources = {}
+_ligature_source_stats = {'hits': 0, 'misses': 0}
+
+def open_ligature_source(ligature_font_file, em):
+    """Open a ligature source font scaled to the given em, reusing it if we
+    already opened it earlier in this process.
+
+    Callers must not modify the returned font, since later ligaturize_font()
+    calls will get the same one.
+    """
+    key = (path.abspath(ligature_font_file), em)
+    if key in _ligature_sources:
+        _ligature_source_stats['hits'] += 1
+        return _ligature_sources[key]
+
+    _ligature_source_stats['misses'] += 1
+    firacode = fontforge.open(ligature_font_file)
+    firacode.em = em
+    _ligature_sources[key] = firacode
+    return firacode
+
+def ligature_source_cache_info():
+    """Return the hit/miss counts and size of the ligature source cache."""
+    return dict(_ligature_source_stats, size=len(_ligature_sources))
+
+def close_fonts():
+    """Close every font fontforge still has open apart from the ligature
+    sources, such as the one a failed ligaturize_font() call left behind."""
+    sources = set(font.path for font in _ligature_sources.values())
+    for font in fontforge.fonts():
+        if font.path not in sources:
+            font.close()
+
 class LigatureCreator(object):
 
     def __init__(self, font, firacode,
                  scale_character_glyphs_threshold,
-                 copy_character_glyphs):
+                 copy_character_glyphs,
+                 merge_calt_lookups=False,
+                 shared_spacer=False,
+                 minimal_calt_rules=False,
+                 outline_cache=None):
         self.font = font
         self.firacode = firacode
         self.scale_character_glyphs_threshold = scale_character_glyphs_threshold
         self.should_copy_character_glyphs = copy_character_glyphs
+        self.plan = GsubPlan(merge_lookups=merge_calt_lookups,
+                             shared_spacer=shared_spacer,
+                             minimal_rules=minimal_calt_rules)
         self._lig_counter = 0
-
-        # Scale firacode to correct em height.
-        self.firacode.em = self.font.em
+        self._shared_spacer_name = None
+        # How many spacer glyphs we created, and how many ligature positions
+        # they're used in (with shared_spacer, many more than the former).
+        self.spacer_glyph_count = 0
+        self.spacer_position_count = 0
+
+        # Scale firacode to correct em height. Fonts from open_ligature_source()
+        # are already the right size, and must not be rescaled here.
+        if self.firacode.em != self.font.em:
+            self.firacode.em = self.font.em
         self.emwidth = self.font[ord('m')].width
-
-    def copy_ligature_from_source(self, ligature_name):
-        try:
-            self.firacode.selection.none()
-            self.firacode.selection.select(ligature_name)
-            self.firacode.copy()
-            return True
-        except ValueError:
-            return False
+        self.char_glyphs = char_glyph_names(self.font)
+
+        # Copied outlines are converted to the output font's curve type before
+        # they're stored, and only anchors the output font has a class for are
+        # kept, just like pasting would.
+        self._quadratic = self.font.layers['Fore'].is_quadratic
+        self._anchor_classes = set(
+            anchor_class
+            for lookup in self.font.gpos_lookups
+            for subtable in self.font.getLookupSubtables(lookup)
+            for anchor_class in self.font.getLookupSubtableAnchorClasses(subtable))
+        # Every spacer glyph is a copy of 'space', so only fetch it once.
+        self._space = None
+
+        # Width-corrected outlines depend on nothing but the source font and
+        # these, so other fonts with the same metrics can reuse them.
+        self.outline_cache = outline_cache
+        self._cached_outlines = {}
+        self.outline_cache_hits = 0
+        self._new_outlines = 0
+        if outline_cache:
+            self._outline_cache_key = outline_cache.key(
+                outline_cache.source_digest(self.firacode.path),
+                self.font.em, self.emwidth, self.scale_character_glyphs_threshold,
+                self._quadratic, sorted(self._anchor_classes))
+            self._cached_outlines = outline_cache.load(self._outline_cache_key)
+
+    def outline_of(self, glyph):
+        """Return a copy of the foreground layer of a glyph, with any references
+        to other glyphs replaced by (transformed) copies of their outlines."""
+        layer = glyph.foreground
+        for reference in glyph.references:
+            name, matrix = reference[0], reference[1]
+            referenced = self.outline_of(glyph.font[name])
+            referenced.transform(matrix)
+            layer += referenced
+        return layer
+
+    def copy_glyph(self, source, target):
+        """Copy the outline, advance width and anchors of one glyph to another,
+        replacing whatever was in it.
+
+        This assigns glyph data directly rather than selecting, copying and
+        pasting, so it doesn't go through the clipboard or either font's
+        selection.
+        """
+        layer = self.outline_of(source)
+        if layer.is_quadratic != self._quadratic:
+            layer.is_quadratic = self._quadratic
+        clear_glyph(target)
+        target.foreground = layer
+        target.width = source.width
+        target.anchorPoints = tuple(
+            anchor for anchor in source.anchorPoints
+            if anchor[0] in self._anchor_classes)
+
+    def copy_corrected_glyph(self, source_name, target, correct):
+        """Copy a glyph from the ligature font and width-correct it by calling
+        correct() on it -- or, if the outline cache already has the result of
+        doing that, load it from there instead."""
+        if source_name in self._cached_outlines:
+            glyph_from_data(target, self._cached_outlines[source_name])
+            self.outline_cache_hits += 1
+            return
+        self.copy_glyph(self.firacode[source_name], target)
+        correct(target)
+        if self.outline_cache:
+            self._cached_outlines[source_name] = glyph_to_data(target)
+            self._new_outlines += 1
+
+    def save_outline_cache(self):
+        """Store any outlines that weren't in the outline cache yet."""
+        if self._new_outlines:
+            self.outline_cache.store(self._outline_cache_key, self._cached_outlines)
+        if self.outline_cache:
+            print('    ...reused %d width-corrected outlines from the outline cache, added %d' % (
+                self.outline_cache_hits, self._new_outlines))
+
+    def create_spacer_glyph(self, name):
+        """Create an empty glyph called name, as wide as 'space'."""
+        if self._space is None:
+            space = self.font['space']
+            self._space = (space.foreground, space.width)
+        glyph = self.font.createChar(-1, name)
+        glyph.foreground, glyph.width = self._space
+        return glyph
 
     def correct_character_width(self, glyph):
         """Width-correct copied individual characters (not ligatures!).
@@ -101,13 +243,9 @@ class LigatureCreator(object):
         print("    ...copying %d character glyphs..." % (len(chars)))
 
         for char in chars:
-            self.firacode.selection.none()
-            self.firacode.selection.select(char)
-            self.firacode.copy()
-            self.font.selection.none()
-            self.font.selection.select(char)
-            self.font.paste()
-            self.correct_character_width(self.font[ord(char_dict[char])])
+            if char in self.char_glyphs:
+                self.copy_corrected_glyph(
+                    char, self.font[self.char_glyphs[char]], self.correct_character_width)
 
     def correct_ligature_width(self, glyph):
         """Correct the horizontal advance and scale of a ligature."""
@@ -131,84 +269,142 @@ class LigatureCreator(object):
             self.copy_character_glyphs(input_chars)
             return
 
-        if not self.copy_ligature_from_source(firacode_ligature_name):
-            # Ligature not in source font.
+        # Ligatures the source font doesn't have were already left out by
+        # resolve_ligatures(). The characters are named as in Fira Code; use
+        # whatever glyphs the output font maps them to instead.
+        glyph_names = [self.char_glyphs.get(char) for char in input_chars]
+        if None in glyph_names:
             return
 
         self._lig_counter += 1
         ligature_name = 'lig.{}'.format(self._lig_counter)
 
-        self.font.createChar(-1, ligature_name)
-        self.font.selection.none()
-        self.font.selection.select(ligature_name)
-        self.font.paste()
-        self.correct_ligature_width(self.font[ligature_name])
-
-        self.font.selection.none()
-        self.font.selection.select('space')
-        self.font.copy()
-
-        lookup_name = lambda i: 'lookup.{}.{}'.format(self._lig_counter, i)
-        lookup_sub_name = lambda i: 'lookup.sub.{}.{}'.format(self._lig_counter, i)
-        cr_name = lambda i: 'CR.{}.{}'.format(self._lig_counter, i)
-
-        for i, char in enumerate(input_chars):
-            self.font.addLookup(lookup_name(i), 'gsub_single', (), ())
-            self.font.addLookupSubtable(lookup_name(i), lookup_sub_name(i))
-
-            if char not in self.font:
-                # We assume here that this is because char is a single letter
-                # (e.g. 'w') rather than a character name, and the font we're
-                # editing doesn't have glyphnames for letters.
-                self.font[ord(char_dict[char])].glyphname = char
-
-            if i < len(input_chars) - 1:
-                self.font.createChar(-1, cr_name(i))
-                self.font.selection.none()
-                self.font.selection.select(cr_name(i))
-                self.font.paste()
-
-                self.font[char].addPosSub(lookup_sub_name(i), cr_name(i))
-            else:
-                self.font[char].addPosSub(lookup_sub_name(i), ligature_name)
-
-        calt_lookup_name = 'calt.{}'.format(self._lig_counter)
-        self.font.addLookup(calt_lookup_name, 'gsub_contextchain', (),
-            (('calt', (('DFLT', ('dflt',)),
-                       ('arab', ('dflt',)),
-                       ('armn', ('dflt',)),
-                       ('cyrl', ('SRB ', 'dflt')),
-                       ('geor', ('dflt',)),
-                       ('grek', ('dflt',)),
-                       ('lao ', ('dflt',)),
-                       ('latn', ('CAT ', 'ESP ', 'GAL ', 'ISM ', 'KSM ', 'LSM ', 'MOL ', 'NSM ', 'ROM ', 'SKS ', 'SSM ', 'dflt')),
-                       ('math', ('dflt',)),
-                       ('thai', ('dflt',)))),))
-        #print('CALT %s (%s)' % (calt_lookup_name, firacode_ligature_name))
-        for i, char in enumerate(input_chars):
-            self.add_calt(calt_lookup_name, 'calt.{}.{}'.format(self._lig_counter, i),
-                '{prev} | {cur} @<{lookup}> | {next}',
-                prev = ' '.join(cr_name(j) for j in range(i)),
-                cur = char,
-                lookup = lookup_name(i),
-                next = ' '.join(input_chars[i+1:]))
-
-        # Add ignore rules
-        self.add_calt(calt_lookup_name, 'calt.{}.{}'.format(self._lig_counter, i+1),
-            '| {first} | {rest} {last}',
-            first = input_chars[0],
-            rest = ' '.join(input_chars[1:]),
-            last = input_chars[-1])
-        self.add_calt(calt_lookup_name, 'calt.{}.{}'.format(self._lig_counter, i+2),
-            '{first} | {first} | {rest}',
-            first = input_chars[0],
-            rest = ' '.join(input_chars[1:]))
-
-    def add_calt(self, calt_name, subtable_name, spec, **kwargs):
-        spec = spec.format(**kwargs)
-        #print('    %s: %s ' % (subtable_name, spec))
-        self.font.addContextualSubtable(calt_name, subtable_name, 'glyph', spec)
+        self.copy_corrected_glyph(firacode_ligature_name,
+            self.font.createChar(-1, ligature_name), self.correct_ligature_width)
+
+        if self.plan.uses_shared_spacer(glyph_names):
+            spacer_names = [self.shared_spacer_glyph()] * (len(input_chars) - 1)
+        else:
+            spacer_names = ['CR.{}.{}'.format(self._lig_counter, i)
+                            for i in range(len(input_chars) - 1)]
+            for spacer_name in spacer_names:
+                self.create_spacer_glyph(spacer_name)
+            self.spacer_glyph_count += len(spacer_names)
+        self.spacer_position_count += len(spacer_names)
+
+        self.plan.add_ligature(self._lig_counter, glyph_names, ligature_name, spacer_names)
+
+    def shared_spacer_glyph(self):
+        """Return the name of the spacer glyph shared by all ligatures, creating
+        it the first time."""
+        if self._shared_spacer_name is None:
+            # Fira Code calls this glyph LIG. Don't clobber a glyph that already
+            # has that name, though.
+            name = 'LIG'
+            while name in self.font:
+                name += '.spacer'
+            self.create_spacer_glyph(name)
+            self.spacer_glyph_count += 1
+            self._shared_spacer_name = name
+        return self._shared_spacer_name
+
+    def add_lookups(self, feature_file=None):
+        """Add the lookups planned by add_ligature() to the font.
+
+        If feature_file is given, write them to it as an OpenType feature file
+        and merge that into the font in one go, rather than adding them one at
+        a time; that's much faster, and leaves a readable copy of the rules.
+        """
+        if feature_file:
+            with open(feature_file, 'w') as fd:
+                fd.write(self.plan.to_fea())
+            self.font.mergeFeature(feature_file)
+            print('    ...merged lookups from %s' % feature_file)
+            return
 
+        for lookup in self.plan.single_lookups:
+            self.font.addLookup(lookup.name, 'gsub_single', (), ())
+            self.font.addLookupSubtable(lookup.name, lookup.subtable)
+            for glyph, replacement in lookup.mapping:
+                self.font[glyph].addPosSub(lookup.subtable, replacement)
+
+        # New lookups and subtables are inserted in front of the existing ones,
+        # so add them in the opposite order to the one they'll be applied in.
+        calt_lookups = self.plan.calt_lookups()
+        for calt_lookup_name, rules in reversed(calt_lookups):
+            self.font.addLookup(calt_lookup_name, 'gsub_contextchain', (),
+                (('calt', CALT_SCRIPTS),))
+            for rule in reversed(rules):
+                self.add_calt(calt_lookup_name, rule)
+        if self.plan.merge_lookups:
+            print('    ...merged calt rules for %d ligatures into %d lookups' % (
+                self._lig_counter, len(calt_lookups)))
+
+    def add_calt(self, calt_name, rule):
+        if rule.lookup:
+            spec = '{prev} | {cur} @<{lookup}> | {next}'
+        else:
+            spec = '{prev} | {cur} | {next}'
+        spec = spec.format(
+            prev = ' '.join(rule.backtrack),
+            cur = rule.input,
+            lookup = rule.lookup,
+            next = ' '.join(rule.lookahead))
+        #print('    %s: %s ' % (rule.name, spec))
+        self.font.addContextualSubtable(calt_name, rule.name, 'glyph', spec)
+
+
+def char_glyph_names(font):
+    """Map the character names in char_dict to the glyphs font maps those
+    characters to, whatever they're called (e.g. uni003D rather than equal).
+    Characters the font doesn't have are left out."""
+    by_codepoint = {}
+    for glyph in font.glyphs():
+        codepoints = [glyph.unicode] + [
+            codepoint for codepoint, selector, _ in glyph.altuni or () if selector == -1]
+        for codepoint in codepoints:
+            if codepoint >= 0:
+                by_codepoint.setdefault(codepoint, glyph.glyphname)
+    return dict((name, by_codepoint[ord(char)]) for name, char in char_dict.items()
+                if ord(char) in by_codepoint)
+
+def glyph_to_data(glyph):
+    """Turn a glyph's outline, width and anchors into something that can be
+    stored as JSON."""
+    layer = glyph.foreground
+    return {
+        'width': glyph.width,
+        'quadratic': layer.is_quadratic,
+        'contours': [
+            [contour.closed, [[point.x, point.y, point.on_curve] for point in contour]]
+            for contour in layer],
+        'anchors': [list(anchor) for anchor in glyph.anchorPoints],
+    }
+
+def clear_glyph(glyph):
+    """Drop everything besides the outline that pasting over a glyph would
+    have replaced: references to other glyphs (e.g. the periods a colon is
+    built from), TrueType instructions and hints."""
+    glyph.references = ()
+    glyph.ttinstrs = b''
+    glyph.hhints = ()
+    glyph.vhints = ()
+
+def glyph_from_data(glyph, data):
+    """Replace a glyph's outline, width and anchors with ones from glyph_to_data()."""
+    layer = fontforge.layer()
+    layer.is_quadratic = data['quadratic']
+    for closed, points in data['contours']:
+        contour = fontforge.contour()
+        contour.is_quadratic = data['quadratic']
+        for x, y, on_curve in points:
+            contour += fontforge.point(x, y, on_curve)
+        contour.closed = closed
+        layer += contour
+    clear_glyph(glyph)
+    glyph.foreground = layer
+    glyph.width = data['width']
+    glyph.anchorPoints = tuple(tuple(anchor) for anchor in data['anchors'])
 
 def replace_sfnt(font, key, value):
     font.sfnt_names = tuple(
@@ -247,9 +443,87 @@ def update_font_metadata(font, new_name):
     replace_sfnt(font, 'Family', new_name)
     replace_sfnt(font, 'WWS Family', new_name)
 
+def generate_patched(font, input_font_file, output_font_file):
+    """Generate font, then replace the tables ligaturizing didn't change with
+    the input font's, if its glyph IDs allow it."""
+    from fontTools.ttLib import TTFont
+    from table_patch import patch_font
+
+    generated_font_file = output_font_file + '.generated' + path.splitext(output_font_file)[1]
+    font.generate(generated_font_file)
+    if patch_font(input_font_file, TTFont(generated_font_file), output_font_file):
+        os.remove(generated_font_file)
+        print('    ...copied unchanged tables from the input font')
+    else:
+        os.replace(generated_font_file, output_font_file)
+        print("    ...can't copy unchanged tables from the input font; using fontforge's")
+
 def ligaturize_font(input_font_file, output_dir, ligature_font_file,
-                    output_name, prefix, **kwargs):
-    font = fontforge.open(input_font_file)
+                    output_name, prefix, feature_file=False,
+                    cache_dir=None, outline_cache_size=256, profile=False,
+                    report=False, patch=False, subset_corpus=None,
+                    subset_chars=None, subset_ligatures=None, on_phase=None,
+                    **kwargs):
+    """Ligaturize one font.
+
+    If feature_file is set, the ligature lookups are written to a feature file
+    next to the output font and merged from there.
+
+    If cache_dir is set, width-corrected outlines are cached in it, in up to
+    outline_cache_size megabytes, and so are the ligatures each ligature
+    source font has (see ligature_plan.py).
+
+    If profile is set, the time spent in each phase, in each ligature and in
+    fontforge calls is printed and written to a report next to the output font.
+
+    If report is set, the output font is compared with the input font and
+    checked for the ligatures that should be in it (see footprint.py), and the
+    result written next to it.
+
+    If patch is set, only the tables ligaturizing changes are taken from the
+    generated font; the rest are copied from the input (see table_patch.py).
+
+    If any of subset_corpus (files and directories of text), subset_chars or
+    subset_ligatures is set, only the ligatures that text uses are added, and
+    a copy of the output font is subset to its characters and also written
+    as WOFF2 (see webfont.py).
+
+    Returns a dict with the path of the generated font ('output_font_file'),
+    of the font the ligatures were copied from ('ligature_font_file') and of
+    the feature file, profile and footprint reports and subset and WOFF2
+    fonts, if any ('feature_file', 'profile_file', 'report_file',
+    'subset_file' and 'woff2_file'), the
+    new font's name ('font_name'), and how many of the ligatures in
+    ligatures.py were added and skipped ('ligatures_added' and
+    'ligatures_skipped').
+
+    If on_phase is given, it's called with the name and duration of each
+    phase of ligaturizing as it's finished.
+
+    Variable fonts are handed to the fonttools engine, since fontforge can't
+    generate them, unless fontTools isn't installed; then they're ligaturized
+    (and come out) as static fonts, as they used to be.
+    """
+    variable = is_variable_font(input_font_file)
+    if variable and not find_spec('fontTools'):
+        print("%s is a variable font, but fontTools isn't installed (pip install"
+              " fonttools); ligaturizing it as a static font" % path.basename(input_font_file))
+    elif variable:
+        print("%s is a variable font; ligaturizing it with the fonttools engine" %
+              path.basename(input_font_file))
+        return get_engine('fonttools').ligaturize_font(
+            input_font_file, output_dir, ligature_font_file, output_name, prefix,
+            feature_file=feature_file, cache_dir=cache_dir,
+            outline_cache_size=outline_cache_size, profile=profile,
+            report=report, patch=patch, subset_corpus=subset_corpus,
+            subset_chars=subset_chars, subset_ligatures=subset_ligatures,
+            on_phase=on_phase, **kwargs)
+
+    profiler = Profiler(on_phase) if profile else NullProfiler(on_phase)
+    with profiler.phase('open font'):
+        font = fontforge.open(input_font_file)
+    if report:
+        summary_before = gsub_summary(font)
 
     if not ligature_font_file:
         ligature_font_file = get_ligature_source(font.fontname)
@@ -261,23 +535,8 @@ def ligaturize_font(input_font_file, output_dir, ligature_font_file,
     if prefix:
         name = "%s %s" % (prefix, name)
 
-    update_font_metadata(font, name)
-
-    print('    ...using ligatures from %s' % ligature_font_file)
-    firacode = fontforge.open(ligature_font_file)
-
-    creator = LigatureCreator(font, firacode, **kwargs)
-    ligature_length = lambda lig: len(lig['chars'])
-    for lig_spec in sorted(ligatures, key = ligature_length):
-        try:
-            creator.add_ligature(lig_spec['chars'], lig_spec['firacode_ligature_name'])
-        except Exception as e:
-            print('Exception while adding ligature: {}'.format(lig_spec))
-            raise
-
-    # Work around a bug in Fontforge where the underline height is subtracted from
-    # the underline width when you call generate().
-    font.upos += font.uwidth
+    with profiler.phase('update metadata'):
+        update_font_metadata(font, name)
 
     # Generate font type (TTF or OTF) corresponding to input font extension
     # (defaults to TTF)
@@ -285,18 +544,179 @@ def ligaturize_font(input_font_file, output_dir, ligature_font_file,
         output_font_type = '.otf'
     else:
         output_font_type = '.ttf'
-
-    # Generate font & move to output directory
     output_font_file = path.join(output_dir, font.fontname + output_font_type)
-    print("    ...saving to '%s' (%s)" % (output_font_file, font.fullname))
-    font.generate(output_font_file)
 
+    with profiler.phase('open ligature source'):
+        firacode = open_ligature_source(ligature_font_file, font.em)
+    print('    ...using ligatures from %s (source cache: %d hits, %d misses)' % (
+        ligature_font_file, _ligature_source_stats['hits'],
+        _ligature_source_stats['misses']))
+    with profiler.phase('resolve ligatures'):
+        resolved = resolve_ligatures(ligature_font_file, lambda: list(firacode), cache_dir)
+    if resolved.missing:
+        print('    ...skipping %d ligatures not in %s' % (len(resolved.missing), ligature_font_file))
+    planned = resolved.ligatures
+    subset = None
+    if subset_corpus or subset_chars or subset_ligatures:
+        with profiler.phase('scan subset text'):
+            subset = web_subset(subset_corpus, subset_chars, subset_ligatures)
+        planned = [lig for lig in planned if subset.keeps(lig)]
+
+    if cache_dir:
+        kwargs['outline_cache'] = OutlineCache(
+            path.join(cache_dir, 'outlines'), outline_cache_size << 20)
+    with profiler.phase('set up'):
+        creator = LigatureCreator(
+            profiler.wrap(font), profiler.wrap(firacode), **kwargs)
+    with profiler.phase('add ligatures'):
+        for lig_spec in planned:
+            try:
+                with profiler.ligature(lig_spec['chars'], lig_spec['firacode_ligature_name']):
+                    creator.add_ligature(lig_spec['chars'], lig_spec['firacode_ligature_name'])
+            except Exception as e:
+                print('Exception while adding ligature: {}'.format(lig_spec))
+                raise
+        creator.save_outline_cache()
+    if feature_file:
+        feature_file = output_font_file + '.fea'
+    with profiler.phase('add lookups'):
+        creator.add_lookups(feature_file)
+    print('    ...added %d ligatures, using %d spacer glyphs for %d spacer positions' % (
+        creator._lig_counter, creator.spacer_glyph_count, creator.spacer_position_count))
+    if creator.plan.minimal_rules:
+        print('    ...%s' % creator.plan.rule_summary())
+
+    # Work around a bug in Fontforge where the underline height is subtracted from
+    # the underline width when you call generate().
+    font.upos += font.uwidth
 
-def parse_args():
+    print("    ...saving to '%s' (%s)" % (output_font_file, font.fullname))
+    with profiler.phase('generate'):
+        if patch:
+            generate_patched(font, input_font_file, output_font_file)
+        else:
+            font.generate(output_font_file)
+    # Nothing needs it any more, and fontforge would otherwise keep it (and
+    # the ligatures copied into it) until the process exits.
+    font.close()
+
+    subset_file = woff2_file = None
+    if subset:
+        with profiler.phase('subset'):
+            subset_file, woff2_file = subset_font(output_font_file, subset)
+        print("    ...subset to %s, and saved as '%s' and '%s'" % (
+            subset.describe(), subset_file, woff2_file))
+
+    report_file = None
+    if report:
+        with profiler.phase('report'):
+            footprint = footprint_report(
+                input_font_file, output_font_file, summary_before, creator.plan,
+                one_subtable_per_rule=not feature_file)
+        print_report(footprint)
+        report_file = output_font_file + '.footprint.json'
+        with open(report_file, 'w') as fd:
+            json.dump(footprint, fd, indent=2, sort_keys=True)
+
+    profile_file = None
+    if profile:
+        profile_file = output_font_file + '.profile.json'
+        profiler.print_summary()
+        profiler.write_report(profile_file)
+    return {
+        'output_font_file': output_font_file,
+        'ligature_font_file': ligature_font_file,
+        'feature_file': feature_file or None,
+        'profile_file': profile_file,
+        'report_file': report_file,
+        'subset_file': subset_file,
+        'woff2_file': woff2_file,
+        'font_name': name,
+        'ligatures_added': creator._lig_counter,
+        'ligatures_skipped': len(resolved.missing) + len([
+            lig for lig in resolved.ligatures if lig['firacode_ligature_name']])
+            - creator._lig_counter,
+    }
+
+
+# The implementations of ligaturize_font() to choose from.
+ENGINES = ['fontforge', 'fonttools']
+
+def get_engine(name):
+    """Return the module with the ligaturize_font() and
+    ligature_source_cache_info() of the given engine."""
+    if name == 'fonttools':
+        import fonttools_engine
+        return fonttools_engine
+    if fontforge is None:
+        raise ImportError("The fontforge engine needs to be run from fontforge"
+                          " (fontforge -lang=py -script ...); use --engine=fonttools"
+                          " to run without it.")
+    return sys.modules[__name__]
+
+def expand_input_fonts(parser, patterns):
+    """Expand the glob patterns among the input font arguments, in order and
+    without duplicates."""
+    input_font_files = []
+    for pattern in patterns:
+        if any(c in pattern for c in '*?['):
+            matches = sorted(glob(pattern))
+            if not matches:
+                parser.error("no fonts match '%s'" % pattern)
+        else:
+            matches = [pattern]
+        input_font_files += [name for name in matches if name not in input_font_files]
+    return input_font_files
+
+def font_matches(input_font_file, pattern):
+    return (fnmatch(input_font_file, pattern) or
+            fnmatch(path.basename(input_font_file), pattern))
+
+def parse_font_mapping(parser, option, values, input_font_files):
+    """Parse the [PATTERN=]VALUE arguments of a repeatable option into a list of
+    (pattern, value), where pattern is None for a value for all fonts."""
+    mapping = []
+    for value in values or []:
+        if '=' in value:
+            pattern, value = value.split('=', 1)
+            if not any(font_matches(name, pattern) for name in input_font_files):
+                parser.error("%s: no input font matches '%s'" % (option, pattern))
+            mapping.append((pattern, value))
+        else:
+            mapping.append((None, value))
+    return mapping
+
+def font_option(mapping, input_font_file, default):
+    """The value from a parse_font_mapping() mapping for input_font_file: that
+    of the first pattern it matches, or else the last value for all fonts."""
+    for pattern, value in mapping:
+        if pattern is not None and font_matches(input_font_file, pattern):
+            return value
+    values = [value for pattern, value in mapping if pattern is None]
+    return values[-1] if values else default
+
+def font_jobs(options):
+    """Split the options parsed by parse_args() (less engine, profile_dump and
+    log_format)
+    into the ligaturize_font() arguments for each input font."""
+    jobs = []
+    for input_font_file in options['input_font_files']:
+        job = dict(options)
+        del job['input_font_files']
+        job['input_font_file'] = input_font_file
+        job['prefix'] = font_option(options['prefix'], input_font_file, 'Liga')
+        job['output_name'] = font_option(options['output_name'], input_font_file, '')
+        jobs.append(job)
+    return jobs
+
+def parse_args(argv=None):
     from argparse import ArgumentParser
     parser = ArgumentParser()
-    parser.add_argument("input_font_file",
-        help="The TTF or OTF font to add ligatures to.")
+    parser.add_argument("input_font_files",
+        nargs='+', metavar='input_font_file',
+        help="The TTF or OTF fonts to add ligatures to. Glob patterns (e.g."
+             " 'fonts/Hack/*.ttf') are expanded. All fonts are ligaturized by"
+             " the same process, so the ligature fonts are only opened once.")
     parser.add_argument("--output-dir",
         help="The directory to save the ligaturized font in. The actual filename"
              " will be automatically generated based on the input font name and"
@@ -321,16 +741,137 @@ def parse_args():
              " they are at least 10%% wider or narrower. A value of 0 will scale"
              " all copied character glyphs; a value of 2 effectively disables"
              " character glyph scaling.")
+    parser.add_argument("--merge-calt-lookups",
+        default=False, action='store_true',
+        help="Put the calt rules for ligatures that can never overlap (e.g."
+             " '&&' and '->') in the same lookup, rather than giving each"
+             " ligature a lookup of its own. Text is shaped the same either way,"
+             " but the output has far fewer lookups for the shaper to walk.")
+    parser.add_argument("--shared-spacer",
+        default=False, action='store_true',
+        help="Replace the non-final characters of every ligature with the same"
+             " empty spacer glyph, like Fira Code itself does, instead of"
+             " creating one spacer glyph per character of every ligature (only"
+             " the few ligatures that can be left unfinished, like >=>, keep"
+             " their own). Renders the same, but adds hundreds fewer glyphs to"
+             " the font.")
+    parser.add_argument("--minimal-calt-rules",
+        default=False, action='store_true',
+        help="Leave out the parts of calt rules (and the rules) that can never"
+             " make a difference to where they match, e.g. the characters after"
+             " a ligature's spacers, which the rule for its first character"
+             " already checked. Shapes text exactly the same, with less to"
+             " match.")
+    parser.add_argument("--feature-file",
+        default=False, action='store_true',
+        help="Write the ligature lookups to an OpenType feature file next to the"
+             " output font (e.g. LigaFoo-Regular.ttf.fea) and merge it into the"
+             " font in one step, rather than building every lookup through the"
+             " fontforge API. Much faster, and the feature file is easy to"
+             " inspect and diff between builds.")
+    parser.add_argument("--cache-dir",
+        type=str, default=None, metavar='DIR',
+        help="Directory to cache width-corrected ligature outlines in. Later"
+             " fonts with the same em size and 'm' width (e.g. other weights of"
+             " the same family) then reuse them instead of rescaling them."
+             " Which ligatures each ligature source font has is cached there"
+             " too. Disabled by default.")
+    parser.add_argument("--outline-cache-size",
+        type=int, default=256, metavar='MB',
+        help="Maximum size of the outline cache in --cache-dir; the least"
+             " recently used entries are deleted beyond this. Default: 256.")
+    parser.add_argument("--report",
+        default=False, action='store_true',
+        help="After generating the font, compare its size and the sizes of its"
+             " tables with the input font's, and reopen it to check that all"
+             " ligature glyphs and calt lookups made it in. The report is"
+             " printed and written next to the output font (e.g."
+             " LigaFoo-Regular.ttf.footprint.json).")
+    parser.add_argument("--profile",
+        default=False, action='store_true',
+        help="Print how long each step of ligaturizing the font took, which"
+             " ligatures were slowest to add and which fontforge calls took the"
+             " most time, and write all of it as JSON next to the output font"
+             " (e.g. LigaFoo-Regular.ttf.profile.json).")
+    parser.add_argument("--profile-dump",
+        type=str, default=None, metavar='FILE',
+        help="Profile the whole run with cProfile and save the stats to FILE,"
+             " for use with pstats, snakeviz or (via e.g. pyspeedscope)"
+             " speedscope.")
+    parser.add_argument("--patch",
+        default=False, action='store_true',
+        help="Only replace the tables ligaturizing changes (glyph outlines,"
+             " metrics, GSUB, names) and copy all other tables (hinting,"
+             " kerning, OS/2...) from the input font byte for byte. Needs"
+             " fontTools. Falls back to the normal output for variable fonts"
+             " and if fontforge reordered the glyphs.")
+    parser.add_argument("--subset-corpus",
+        type=str, action='append', default=None, metavar='PATH',
+        help="Make a web font for the text in PATH (a file, or a directory"
+             " to read all files in): only add the ligatures that occur in it,"
+             " and write a copy of the output font subset to the characters it"
+             " uses, both as e.g. LigaFoo-Regular.subset.ttf and as WOFF2."
+             " May be given more than once. Needs fontTools and brotli.")
+    parser.add_argument("--subset-chars",
+        type=str, default=None, metavar='TEXT',
+        help="Make a web font like --subset-corpus that (also) keeps the"
+             " characters in TEXT.")
+    parser.add_argument("--subset-ligatures",
+        type=str, default=None, metavar='LIST',
+        help="Make a web font like --subset-corpus that (also) keeps the"
+             " ligatures in LIST, e.g. '-> => !='.")
+    parser.add_argument("--log-format",
+        choices=LOG_FORMATS, default='text',
+        help="'jsonl' writes one JSON object per line to stdout for every font"
+             " started, phase finished and font done or failed, with what"
+             " fontforge wrote to stderr counted per font, instead of the usual"
+             " commentary. Default: text.")
+    parser.add_argument("--engine",
+        choices=ENGINES, default='fontforge',
+        help="What to read and write fonts with. 'fonttools' doesn't need"
+             " fontforge and starts much faster, but doesn't copy anchors and"
+             " doesn't support --report. Default: fontforge.")
     parser.add_argument("--prefix",
-        type=str, default="Liga",
-        help="String to prefix the name of the generated font with.")
+        type=str, action='append', default=None, metavar='[PATTERN=]PREFIX',
+        help="String to prefix the name of the generated font with. Default:"
+             " Liga. May be given more than once, as PATTERN=PREFIX, to use a"
+             " different prefix for the input fonts whose path or filename"
+             " matches the glob PATTERN (e.g. 'Hack-*=Liga').")
     parser.add_argument("--output-name",
-        type=str, default="",
-        help="Name of the generated font. Completely replaces the original.")
-    return parser.parse_args()
-
-def main():
-    ligaturize_font(**vars(parse_args()))
+        type=str, action='append', default=None, metavar='[PATTERN=]NAME',
+        help="Name of the generated font. Completely replaces the original."
+             " May be given more than once, as PATTERN=NAME, like --prefix.")
+    args = parser.parse_args(argv)
+    args.input_font_files = expand_input_fonts(parser, args.input_font_files)
+    args.prefix = parse_font_mapping(
+        parser, '--prefix', args.prefix, args.input_font_files)
+    args.output_name = parse_font_mapping(
+        parser, '--output-name', args.output_name, args.input_font_files)
+    return args
+
+def ligaturize_fonts(engine, options, log_format='text'):
+    """Ligaturize every font in options. With the jsonl log format, a font
+    that fails doesn't stop the others, and its result is None."""
+    if log_format == 'text':
+        return [engine.ligaturize_font(**job) for job in font_jobs(options)]
+    log = event_log(log_format)
+    return [run_logged(log, engine.ligaturize_font, job)[0] for job in font_jobs(options)]
+
+def main(argv=None):
+    args = vars(parse_args(argv))
+    engine = get_engine(args.pop('engine'))
+    profile_dump = args.pop('profile_dump')
+    log_format = args.pop('log_format')
+    event_log(log_format).claim_stdout()
+    if profile_dump:
+        import cProfile
+        profiler = cProfile.Profile()
+        results = profiler.runcall(ligaturize_fonts, engine, args, log_format)
+        profiler.dump_stats(profile_dump)
+    else:
+        results = ligaturize_fonts(engine, args, log_format)
+    if None in results:
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# On-disk cache of ligature and character outlines that have already been
+# copied from a ligature source font and width-corrected for a particular set
+# of output font metrics. Every weight of a family, and .otf/.ttf twins, tend
+# to share their em size and 'm' width, so after the first of them the rest can
+# load the corrected outlines instead of copying and transforming them again.
+#
+# This module only stores and evicts entries; what's in them is up to the
+# caller (see LigatureCreator in ligaturize.py).
+
+import hashlib
+import json
+import os
+from os import path
+
+
+class OutlineCache(object):
+    """A directory of JSON files, one per set of output font metrics, that is
+    kept under max_bytes by deleting the least recently used files."""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._source_digests = {}
+
+    def source_digest(self, source_file):
+        """Hash the contents of a ligature source font."""
+        if source_file not in self._source_digests:
+            digest = hashlib.sha256()
+            with open(source_file, 'rb') as fd:
+                for block in iter(lambda: fd.read(1 << 20), b''):
+                    digest.update(block)
+            self._source_digests[source_file] = digest.hexdigest()
+        return self._source_digests[source_file]
+
+    def key(self, *parts):
+        """Turn anything JSON-serializable into a cache key."""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return path.join(self.cache_dir, key + '.json')
+
+    def load(self, key):
+        """Return the entries stored under key, or {} if there aren't any."""
+        try:
+            with open(self._path(key)) as fd:
+                entries = json.load(fd)
+        except (IOError, ValueError):
+            return {}
+        # Mark it as recently used.
+        try:
+            os.utime(self._path(key), None)
+        except OSError:
+            # Evicted by another process since we read it.
+            pass
+        return entries
+
+    def store(self, key, entries):
+        """Store entries under key, then evict old files if we're over size."""
+        # Other processes sharing the cache may be creating it at the same time.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a temporary file first, so that other processes sharing the
+        # cache never see a partially written one.
+        tmp = '%s.%d.tmp' % (self._path(key), os.getpid())
+        with open(tmp, 'w') as fd:
+            json.dump(entries, fd, separators=(',', ':'))
+        os.replace(tmp, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used files until the cache fits in max_bytes."""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(path.join(self.cache_dir, name))
+            except OSError:
+                # Evicted by someone else in the meantime.
+                continue
+            files.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# Release packaging for build.py --pack.
+#
+# `make pack` zips up the output directory in one go once every font has been
+# built, which adds a long serial step to the end of a release build. A Packer
+# instead runs in a process of its own and takes each font as soon as it's
+# finished, while the next ones are still being ligaturized: it writes WOFF
+# and WOFF2 copies next to the font, hashes all of them and adds them to the
+# release archive. Once the last font is in, only SHA256SUMS is left to add.
+# Needs fontTools, and brotli for WOFF2 (pip install fonttools brotli).
+
+import hashlib
+import os
+import traceback
+import zipfile
+from importlib.util import find_spec
+from multiprocessing import get_all_start_methods, get_context
+from os import path
+
+# The checksum file added to the archive and written to the output directory.
+CHECKSUMS_NAME = 'SHA256SUMS'
+
+def web_flavors():
+    """The web font flavors we can write: WOFF, and WOFF2 if brotli is there."""
+    flavors = ['woff']
+    if find_spec('brotli'):
+        flavors.append('woff2')
+    return flavors
+
+def convert(font_file, flavor):
+    """Write font_file as a WOFF or WOFF2 font next to it, unless there's one
+    that's newer than it already. Returns the path of the web font."""
+    from fontTools.ttLib import TTFont
+
+    web_file = path.splitext(font_file)[0] + '.' + flavor
+    if path.exists(web_file) and path.getmtime(web_file) >= path.getmtime(font_file):
+        return web_file
+    font = TTFont(font_file)
+    font.flavor = flavor
+    tmp = '%s.%d.tmp' % (web_file, os.getpid())
+    font.save(tmp)
+    os.replace(tmp, web_file)
+    return web_file
+
+def file_sha256(file):
+    digest = hashlib.sha256()
+    with open(file, 'rb') as fd:
+        for block in iter(lambda: fd.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def pack_fonts(queue, results, archive_file, flavors):
+    """Run by the packer process: pack each font file from queue into
+    archive_file (as archive_file.tmp) until it gets None, then add the
+    checksums and put the outcome on results."""
+    try:
+        results.put(write_archive(queue, archive_file, flavors))
+    except Exception:
+        # Don't leave the build waiting for an outcome that never comes.
+        results.put({'files': 0, 'checksums': '',
+                     'errors': [(archive_file, traceback.format_exc())]})
+
+def write_archive(queue, archive_file, flavors):
+    checksums = {}
+    errors = []
+    with zipfile.ZipFile(archive_file + '.tmp', 'w', zipfile.ZIP_DEFLATED,
+                         compresslevel=9) as archive:
+        for font_file in iter(queue.get, None):
+            try:
+                files = [font_file] + [convert(font_file, flavor) for flavor in flavors]
+                for file in files:
+                    name = path.basename(file)
+                    if name not in checksums:
+                        checksums[name] = file_sha256(file)
+                        archive.write(file, name)
+            except Exception:
+                errors.append((font_file, traceback.format_exc()))
+        sums = ''.join('%s  %s\n' % (checksums[name], name) for name in sorted(checksums))
+        archive.writestr(CHECKSUMS_NAME, sums)
+    return {'files': len(checksums), 'checksums': sums, 'errors': errors}
+
+
+class Packer(object):
+    """Packs fonts into a release archive in the background, in the order
+    they're added."""
+
+    def __init__(self, archive_file):
+        self.archive_file = archive_file
+        if 'fork' in get_all_start_methods():
+            context = get_context('fork')
+        else:
+            context = get_context()
+        # Simple queues have no feeder thread, so the build can still fork
+        # its workers safely after fonts have been added.
+        self.queue = context.SimpleQueue()
+        self.results = context.SimpleQueue()
+        self.process = context.Process(
+            target=pack_fonts,
+            args=(self.queue, self.results, archive_file, web_flavors()))
+        self.process.start()
+
+    def add(self, font_file):
+        self.queue.put(font_file)
+
+    def finish(self, output_dir, keep=True):
+        """Wait for the packer to finish. If keep is set and every font was
+        packed, move the archive into place and write SHA256SUMS to output_dir;
+        otherwise throw it away.
+
+        Returns a dict with the number of files packed ('files') and a list of
+        (font file, traceback) for the fonts that couldn't be ('errors').
+        """
+        self.queue.put(None)
+        outcome = self.results.get()
+        self.process.join()
+        if keep and not outcome['errors']:
+            os.replace(self.archive_file + '.tmp', self.archive_file)
+            with open(path.join(output_dir, CHECKSUMS_NAME), 'w') as fd:
+                fd.write(outcome['checksums'])
+        elif path.exists(self.archive_file + '.tmp'):
+            os.remove(self.archive_file + '.tmp')
+        return outcome
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# Timing and fontforge call counting for ligaturize.py --profile.
+#
+# A Profiler records how long each phase of ligaturizing a font took, how long
+# each ligature took to add, and -- for fonts wrapped with Profiler.wrap() --
+# how often each fontforge method was called and how long those calls took.
+# When profiling is off, ligaturize.py uses a NullProfiler, which records
+# nothing and wraps nothing. Either can also pass the time each phase took on
+# to an on_phase callback, for --log-format=jsonl.
+
+import json
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fontforge
+except ImportError:
+    # Running the fonttools engine, which has nothing to wrap.
+    fontforge = None
+
+
+class Profiler(object):
+
+    def __init__(self, on_phase=None):
+        self.on_phase = on_phase
+        self.phases = OrderedDict()
+        self.ligatures = []
+        # {name: [count, seconds]} for every fontforge call made through a
+        # wrapped object.
+        self.calls = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of a with statement as the phase called name."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            seconds = time.time() - start
+            self.phases[name] = self.phases.get(name, 0) + seconds
+            if self.on_phase:
+                self.on_phase(name, seconds)
+
+    @contextmanager
+    def ligature(self, chars, name):
+        """Time the body of a with statement as adding one ligature."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.ligatures.append({
+                'chars': list(chars),
+                'name': name,
+                'seconds': time.time() - start,
+            })
+
+    def count(self, name, seconds):
+        counter = self.calls.setdefault(name, [0, 0])
+        counter[0] += 1
+        counter[1] += seconds
+
+    def wrap(self, obj):
+        """Return a proxy for a fontforge font (or glyph) that counts method
+        calls on it, and on the fonts and glyphs those return."""
+        if fontforge and isinstance(obj, (fontforge.font, fontforge.glyph)):
+            return CountingProxy(obj, self)
+        return obj
+
+    def report(self):
+        """Return everything recorded, as something that can be stored as JSON."""
+        return {
+            'phases': self.phases,
+            'ligatures': self.ligatures,
+            'calls': dict(
+                (name, {'count': count, 'seconds': seconds})
+                for name, (count, seconds) in self.calls.items()),
+        }
+
+    def write_report(self, report_file):
+        with open(report_file, 'w') as fd:
+            json.dump(self.report(), fd, indent=2)
+
+    def print_summary(self, slowest=5, top_calls=10):
+        total = sum(self.phases.values())
+        print('    ...profile:')
+        for name, seconds in self.phases.items():
+            print('        %-24s %8.3fs %5.1f%%' % (
+                name, seconds, 100 * seconds / total if total else 0))
+        print('        %-24s %8.3fs' % ('total', total))
+
+        if self.ligatures:
+            ligature_time = sum(lig['seconds'] for lig in self.ligatures)
+            print('        %d ligatures, %.1fms each on average; slowest:' % (
+                len(self.ligatures), 1000 * ligature_time / len(self.ligatures)))
+            for lig in sorted(self.ligatures, key=lambda lig: -lig['seconds'])[:slowest]:
+                print('            %-40s %8.1fms' % (
+                    ' '.join(lig['chars']), 1000 * lig['seconds']))
+
+        if self.calls:
+            print('        fontforge calls (by total time):')
+            calls = sorted(self.calls.items(), key=lambda item: -item[1][1])
+            for name, (count, seconds) in calls[:top_calls]:
+                print('            %-32s %7d calls %8.3fs' % (name, count, seconds))
+
+
+class NullProfiler(Profiler):
+    """A Profiler that doesn't record anything."""
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            if self.on_phase:
+                self.on_phase(name, time.time() - start)
+
+    @contextmanager
+    def ligature(self, chars, name):
+        yield
+
+    def wrap(self, obj):
+        return obj
+
+
+class CountingProxy(object):
+    """Stands in for a fontforge font or glyph, passing everything through to
+    it while counting (and timing) method calls and attribute assignments."""
+
+    def __init__(self, obj, profiler):
+        object.__setattr__(self, '_obj', obj)
+        object.__setattr__(self, '_profiler', profiler)
+        object.__setattr__(self, '_type', type(obj).__name__)
+
+    def _call(self, name, fn, *args, **kwargs):
+        start = time.time()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            self._profiler.count('%s.%s' % (self._type, name), time.time() - start)
+        return self._profiler.wrap(result)
+
+    def __getattr__(self, name):
+        value = getattr(self._obj, name)
+        if not callable(value):
+            return value
+        return lambda *args, **kwargs: self._call(name, value, *args, **kwargs)
+
+    def __setattr__(self, name, value):
+        self._call(name + '=', setattr, self._obj, name, value)
+
+    def __getitem__(self, key):
+        return self._call('[]', self._obj.__getitem__, key)
+
+    def __contains__(self, key):
+        return self._call('in', self._obj.__contains__, key)
+
+    def __iter__(self):
+        return iter(self._obj)
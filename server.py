@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+#
+# usage: fontforge -lang=py -script server.py [--port=PORT | --socket=PATH] [options]
+#
+# Ligaturizes fonts on request. A pool of worker processes is started once,
+# each with the ligature source fonts already open, so a request only pays for
+# ligaturizing its font -- not for starting fontforge, importing everything and
+# opening Fira Code again.
+#
+# Requests are HTTP, over TCP (localhost only) or a Unix socket:
+#
+#   POST /ligaturize   {"args": ["path/to/Font.ttf", "--prefix=Liga", ...]}
+#       Ligaturizes a font. "args" are ligaturize.py command line arguments.
+#       Responds with the JSON result of ligaturize_font() (a list of them if
+#       args names more than one font), or, if the request has
+#       "return_font": true, with the generated font itself.
+#   GET /stats
+#       Queue depth, request counts and latencies.
+#
+# e.g.
+#   curl -s --unix-socket /tmp/ligaturize.sock http://localhost/ligaturize \
+#       -d '{"args": ["fonts/Hermit/Hermit-Regular.otf", "--output-dir=/tmp"]}'
+#
+# With --engine=fonttools the server runs under a plain Python interpreter.
+
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from argparse import ArgumentParser
+from glob import glob
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing import get_all_start_methods, get_context
+from os import path
+
+import ligaturize
+
+# The ligature source fonts workers open before taking any requests, and the
+# em sizes (for the fontforge engine, which keeps one copy per em size) to
+# open them at: those of most OpenType and most TrueType fonts.
+DEFAULT_PRELOAD = 'fonts/fira/distr/otf/*.otf'
+PRELOAD_EMS = [1000, 2048]
+
+# ligaturize.py options that only make sense for a run of its own: they would
+# profile or change the log output of the whole worker.
+UNSUPPORTED_OPTIONS = ['--profile-dump', '--log-format']
+
+# How many recent requests latency percentiles are computed over.
+LATENCY_WINDOW = 1000
+
+def warm_worker(engine_name, preload):
+    """Open the ligature source fonts in a new worker process."""
+    engine = ligaturize.get_engine(engine_name)
+    for ligature_font_file in preload:
+        if engine_name == 'fonttools':
+            engine.open_ligature_source(ligature_font_file)
+        else:
+            for em in PRELOAD_EMS:
+                engine.open_ligature_source(ligature_font_file, em)
+
+def run_request(argv):
+    """Ligaturize fonts in a worker process. Returns (results, error, seconds)."""
+    start = time.time()
+    engine = None
+    try:
+        options = vars(ligaturize.parse_args(argv))
+        engine = ligaturize.get_engine(options.pop('engine'))
+        # The handler rejects requests that set these.
+        options.pop('profile_dump')
+        options.pop('log_format')
+        results = ligaturize.ligaturize_fonts(engine, options)
+        return results, None, time.time() - start
+    except SystemExit:
+        return None, 'invalid arguments: %s' % ' '.join(argv), time.time() - start
+    except Exception:
+        return None, traceback.format_exc(), time.time() - start
+    finally:
+        # Don't let a failed request's font linger in the worker.
+        if engine:
+            engine.close_fonts()
+
+
+class Stats(object):
+    """Request counts and latencies, shared by all request handler threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        # (total seconds, seconds spent ligaturizing) for recent requests.
+        self.latencies = []
+
+    def submitted(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def finished(self, ok, total, work):
+        with self.lock:
+            self.in_flight -= 1
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.latencies = self.latencies[-(LATENCY_WINDOW - 1):] + [(total, work)]
+
+    def report(self, workers):
+        with self.lock:
+            # Requests beyond one per worker are waiting for a worker.
+            report = {
+                'workers': workers,
+                'queue_depth': max(0, self.in_flight - workers),
+                'running': min(self.in_flight, workers),
+                'completed': self.completed,
+                'failed': self.failed,
+            }
+            for i, name in enumerate(['latency', 'work_time']):
+                times = sorted(latency[i] for latency in self.latencies)
+                if times:
+                    report[name] = {
+                        'mean': sum(times) / len(times),
+                        'p50': times[len(times) // 2],
+                        'p95': times[int(len(times) * 0.95)],
+                        'max': times[-1],
+                    }
+            return report
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status, body):
+        data = json.dumps(body, indent=2, sort_keys=True).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/stats':
+            return self.send_json(404, {'error': 'not found'})
+        self.send_json(200, self.server.stats.report(self.server.workers))
+
+    def do_POST(self):
+        if self.path != '/ligaturize':
+            return self.send_json(404, {'error': 'not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            argv = [str(arg) for arg in request['args']]
+        except (ValueError, KeyError, TypeError):
+            return self.send_json(400, {'error': 'expected {"args": [...]}'})
+        for option in UNSUPPORTED_OPTIONS:
+            if any(arg.startswith(option) for arg in argv):
+                return self.send_json(400, {'error': '%s is unsupported in server mode' % option})
+        if not any(arg.startswith('--output-dir') for arg in argv):
+            argv.append('--output-dir=' + self.server.output_dir)
+        # Requests use the engine the workers were warmed up for, unless they
+        # ask for another one.
+        if not any(arg.startswith('--engine') for arg in argv):
+            argv.append('--engine=' + self.server.engine)
+
+        stats = self.server.stats
+        start = time.time()
+        stats.submitted()
+        results, error, work = self.server.pool.apply_async(run_request, (argv,)).get()
+        stats.finished(error is None, time.time() - start, work)
+
+        if error:
+            return self.send_json(500, {'error': error})
+        if not request.get('return_font'):
+            return self.send_json(200, results[0] if len(results) == 1 else results)
+        if len(results) != 1:
+            return self.send_json(400, {'error': 'return_font needs exactly one font'})
+        result = results[0]
+        with open(result['output_font_file'], 'rb') as fd:
+            data = fd.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'font/' + result['output_font_file'][-3:].lower())
+        self.send_header('Content-Disposition', 'attachment; filename="%s"' %
+                         path.basename(result['output_font_file']))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return self.client_address[0] if self.client_address else 'unix'
+
+
+class TCPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = socketserver.UnixStreamServer.get_request(self)
+        return request, None
+
+
+def parse_args():
+    parser = ArgumentParser(
+        description="Ligaturize fonts on request, using a pool of warm workers.")
+    parser.add_argument("--port",
+        type=int, default=8765,
+        help="Listen for HTTP requests on localhost on this port. Default: 8765.")
+    parser.add_argument("--socket",
+        type=str, default=None, metavar='PATH',
+        help="Listen for HTTP requests on this Unix socket instead.")
+    parser.add_argument("--workers", "-j",
+        type=int, default=0, metavar='N',
+        help="How many worker processes to start. Default: one per CPU.")
+    parser.add_argument("--engine",
+        choices=ligaturize.ENGINES, default='fontforge',
+        help="Which engine to preload the ligature sources for, and to use for"
+             " requests that don't pass --engine themselves. Default: fontforge.")
+    parser.add_argument("--preload",
+        type=str, action='append', default=None, metavar='GLOB',
+        help="Ligature source fonts to open in every worker at startup. Can be"
+             " given more than once. Default: %s." % DEFAULT_PRELOAD)
+    parser.add_argument("--output-dir",
+        type=str, default='fonts/output', metavar='DIR',
+        help="Where to put fonts for requests that don't pass --output-dir."
+             " Default: fonts/output.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    preload = sorted(set(
+        name for pattern in args.preload or [DEFAULT_PRELOAD] for name in glob(pattern)))
+    workers = args.workers or os.cpu_count() or 1
+    if not path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    # Start the workers before any threads, so forking them is safe.
+    if 'fork' in get_all_start_methods():
+        context = get_context('fork')
+    else:
+        context = get_context()
+    pool = context.Pool(workers, initializer=warm_worker,
+                        initargs=(args.engine, preload))
+
+    if args.socket:
+        if path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixServer(args.socket, RequestHandler)
+        where = args.socket
+    else:
+        server = TCPServer(('127.0.0.1', args.port), RequestHandler)
+        where = 'http://127.0.0.1:%d/' % args.port
+    server.pool = pool
+    server.workers = workers
+    server.stats = Stats()
+    server.output_dir = args.output_dir
+    server.engine = args.engine
+
+    print("Ligaturizing on %s with %d %s workers, %d ligature sources preloaded." % (
+        where, workers, args.engine, len(preload)))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.terminate()
+        if args.socket and path.exists(args.socket):
+            os.remove(args.socket)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+#
+# usage: python shapebench.py [--pair ORIGINAL=LIGATURIZED ...] [SOURCE_DIR ...]
+#
+# Measures how fast HarfBuzz shapes text with ligaturized fonts, compared to the
+# fonts they were made from, to show what the calt lookups added by
+# ligaturize.py cost at runtime. The text is generated from ligatures.py (like
+# "make testpattern", but as much of it as you like) and/or read from source
+# trees given on the command line.
+#
+# By default the fonts are taken from the manifest build.py leaves in
+# fonts/output/. Requires the uharfbuzz module (pip install uharfbuzz); unlike
+# the rest of the ligaturizer, this doesn't need fontforge.
+
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from os import path
+
+try:
+    import uharfbuzz as hb
+except ImportError:
+    hb = None
+
+from char_dict import char_dict
+from ligatures import ligatures
+
+# Where to look for font pairs if none are given.
+DEFAULT_MANIFEST = 'fonts/output/ligaturize-manifest.json'
+
+# Which files to read from source trees.
+SOURCE_EXTENSIONS = ['.c', '.cc', '.cpp', '.go', '.h', '.hs', '.java', '.js',
+                     '.lua', '.py', '.rb', '.rs', '.sh', '.ts']
+
+def ligature_strings():
+    """Return the text of every ligature in ligatures.py."""
+    return [''.join(char_dict.get(char, char) for char in lig['chars'])
+            for lig in ligatures if lig['firacode_ligature_name']]
+
+def ligature_text(line_count):
+    """Generate line_count lines of code-like text, with every ligature in
+    ligatures.py between identifiers."""
+    strings = ligature_strings()
+    lines = []
+    i = 0
+    while len(lines) < line_count:
+        words = []
+        for _ in range(8):
+            words.append('x%d %s' % (i, strings[i % len(strings)]))
+            i += 1
+        lines.append(' '.join(words) + ' y;')
+    return lines
+
+def corpus_text(roots, line_count):
+    """Read up to line_count non-blank lines from the source files under roots."""
+    lines = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            for filename in sorted(filenames):
+                if path.splitext(filename)[1] not in SOURCE_EXTENSIONS:
+                    continue
+                with open(path.join(dirpath, filename), 'rb') as fd:
+                    text = fd.read().decode('utf-8', 'replace')
+                lines.extend(line for line in text.splitlines() if line.strip())
+                if len(lines) >= line_count:
+                    return lines[:line_count]
+    return lines
+
+def font_pairs_from_manifest(manifest_file):
+    """Return (original, ligaturized) font file pairs from a build.py manifest."""
+    with open(manifest_file) as fd:
+        manifest = json.load(fd)
+    pairs = []
+    for job_id, entry in sorted(manifest.items()):
+        original = job_id.split(':')[0]
+        if path.exists(original) and path.exists(entry['output_font_file']):
+            pairs.append((original, entry['output_font_file']))
+    return pairs
+
+def load_font(font_file):
+    blob = hb.Blob.from_file_path(font_file)
+    return hb.Font(hb.Face(blob))
+
+def shape_lines(font, lines):
+    """Shape every line once and return the total number of glyphs produced."""
+    glyphs = 0
+    for line in lines:
+        buf = hb.Buffer()
+        buf.add_str(line)
+        buf.guess_segment_properties()
+        hb.shape(font, buf)
+        glyphs += len(buf.glyph_infos)
+    return glyphs
+
+def benchmark(font_file, lines, iterations):
+    """Shape lines with font_file iterations times, and return the glyph count
+    and the fastest time."""
+    font = load_font(font_file)
+    # Warm up HarfBuzz's caches (and make sure the font loads) before timing.
+    glyphs = shape_lines(font, lines[:100])
+    best = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        glyphs = shape_lines(font, lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        'font_file': font_file,
+        'glyphs': glyphs,
+        'seconds': best,
+        'glyphs_per_second': glyphs / best if best else 0,
+        'us_per_line': 1e6 * best / len(lines) if lines else 0,
+    }
+
+def parse_args():
+    parser = ArgumentParser(
+        description="Compare HarfBuzz shaping speed of ligaturized fonts and"
+                    " their originals.")
+    parser.add_argument("source_dirs",
+        nargs='*', metavar='SOURCE_DIR',
+        help="Shape the source files in these directories, rather than text"
+             " generated from ligatures.py.")
+    parser.add_argument("--pair",
+        action='append', default=[], metavar='ORIGINAL=LIGATURIZED',
+        help="A font and its ligaturized version. Can be given more than once."
+             " If not given, the fonts in --manifest are used.")
+    parser.add_argument("--manifest",
+        type=str, default=DEFAULT_MANIFEST, metavar='FILE',
+        help="The build.py manifest to take font pairs from. Default: %s." % DEFAULT_MANIFEST)
+    parser.add_argument("--lines",
+        type=int, default=10000,
+        help="How many lines of text to shape. Default: 10000.")
+    parser.add_argument("--iterations", "-n",
+        type=int, default=5,
+        help="How many times to shape the text with each font; the fastest"
+             " time counts. Default: 5.")
+    parser.add_argument("--output", "-o",
+        type=str, default=None, metavar='FILE',
+        help="Also write the results as JSON to this file.")
+    return parser.parse_args()
+
+def main():
+    if hb is None:
+        print("Error: shapebench.py needs the uharfbuzz module (pip install uharfbuzz).")
+        sys.exit(1)
+    args = parse_args()
+
+    if args.pair:
+        pairs = [tuple(pair.split('=', 1)) for pair in args.pair]
+    else:
+        pairs = font_pairs_from_manifest(args.manifest)
+    if not pairs:
+        print("Error: no fonts to benchmark; build some or pass --pair.")
+        sys.exit(1)
+
+    if args.source_dirs:
+        lines = corpus_text(args.source_dirs, args.lines)
+    else:
+        lines = ligature_text(args.lines)
+    print("Shaping %d lines (%d characters), best of %d runs." % (
+        len(lines), sum(len(line) for line in lines), args.iterations))
+
+    print('%-48s %14s %14s %10s %8s' % (
+        'font', 'glyphs/s', 'liga glyphs/s', 'us/line', 'slowdown'))
+    results = []
+    for original, ligaturized in pairs:
+        before = benchmark(original, lines, args.iterations)
+        after = benchmark(ligaturized, lines, args.iterations)
+        results.append({'original': before, 'ligaturized': after})
+        print('%-48s %14.0f %14.0f %10.1f %7.2fx' % (
+            path.basename(ligaturized), before['glyphs_per_second'],
+            after['glyphs_per_second'], after['us_per_line'],
+            after['seconds'] / before['seconds'] if before['seconds'] else 0))
+
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump({'lines': len(lines), 'iterations': args.iterations,
+                       'fonts': results}, fd, indent=2)
+
+if __name__ == '__main__':
+    main()
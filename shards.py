@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#
+# Sharded builds, for build.py --write-jobs, --jobs-file, --shard and
+# --merge-shards.
+#
+# The whole font list can take longer to build than one CI runner is given,
+# so the build can be split across machines. --write-jobs writes the expanded
+# job list -- every glob in build.py resolved to concrete fonts and options --
+# to a jobs file, along with each font's cost (its size, which is roughly what
+# ligaturizing it takes). Every runner then builds the same jobs file with
+# --shard i/n, which picks its share of the fonts: the fonts are dealt out
+# biggest first, each to the shard with the least work so far, so that the
+# shards take about as long as each other, and every runner arrives at the
+# same split. Each shard writes its own manifest and log to the output
+# directory; --merge-shards n checks that all n shards built all of their
+# fonts and combines their manifests, logs and reports.
+
+import json
+import os
+from argparse import ArgumentTypeError
+
+JOBS_FILE_VERSION = 1
+
+# What a merged build's per-shard logs are combined into, in the output
+# directory; each shard writes its own, as shard_file(LOG_NAME, i, n).
+LOG_NAME = 'ligaturize-log.json'
+
+def parse_shard(text):
+    """Parse 'i/n' (shards are numbered from 1) into (i, n)."""
+    try:
+        index, count = [int(part) for part in text.split('/')]
+    except ValueError:
+        raise ArgumentTypeError("expected i/n, e.g. 1/4, not '%s'" % text)
+    if not 1 <= index <= count:
+        raise ArgumentTypeError("shard %d/%d doesn't exist" % (index, count))
+    return index, count
+
+def shard_file(name, index, count):
+    """The name of a shard's copy of the file name, e.g.
+    ligaturize-manifest.shard-1-of-4.json."""
+    base, ext = os.path.splitext(name)
+    return '%s.shard-%d-of-%d%s' % (base, index, count, ext)
+
+def job_cost(job):
+    return os.path.getsize(job['input_font_file'])
+
+def write_jobs_file(jobs_file, output_dir, jobs):
+    entries = [{'job': job, 'cost': job_cost(job)} for job in jobs]
+    with open(jobs_file + '.tmp', 'w') as fd:
+        json.dump({'version': JOBS_FILE_VERSION, 'output_dir': output_dir, 'jobs': entries},
+                  fd, indent=2, sort_keys=True)
+    os.replace(jobs_file + '.tmp', jobs_file)
+
+def read_jobs_file(jobs_file):
+    """Return the output directory, jobs and their costs from a jobs file."""
+    with open(jobs_file) as fd:
+        contents = json.load(fd)
+    if contents.get('version') != JOBS_FILE_VERSION:
+        raise ValueError('%s is not a version %d jobs file; write it again with --write-jobs' % (
+            jobs_file, JOBS_FILE_VERSION))
+    entries = contents['jobs']
+    return (contents['output_dir'], [entry['job'] for entry in entries],
+            [entry['cost'] for entry in entries])
+
+def assign_shards(costs, count):
+    """Split jobs with the given costs into count shards of about the same
+    total cost. Returns a list of the indices of the jobs in each shard, the
+    most costly first."""
+    shards = [[] for _ in range(count)]
+    totals = [0] * count
+    # Ties are broken by position, so that the split only depends on the costs.
+    for i in sorted(range(len(costs)), key=lambda i: (-costs[i], i)):
+        shard = min(range(count), key=lambda shard: (totals[shard], shard))
+        shards[shard].append(i)
+        totals[shard] += costs[i]
+    return shards
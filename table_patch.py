@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+#
+# Table-preserving output for ligaturize.py --patch.
+#
+# Ligaturizing only adds glyphs and lookups, but writing the result out from
+# fontforge re-encodes every table in the font: hinting, kerning, charstrings
+# and all. With --patch, the output is instead the input font with only the
+# tables that ligaturizing changes replaced; every other table is copied from
+# the input byte for byte. Needs fontTools (pip install fonttools).
+
+from fontTools.ttLib import TTFont
+
+# Tables that are taken from the ligaturized font as they are.
+REPLACED_TABLES = ['glyf', 'loca', 'CFF ', 'hmtx', 'vmtx', 'GSUB', 'name']
+
+# Tables that are taken from the input font but recompiled, so that the glyph
+# counts and bounds (and, for post, the glyph names) in them are updated.
+RECOMPILED_TABLES = ['head', 'hhea', 'vhea', 'maxp', 'post']
+
+# Tables with one entry per glyph that nothing here knows how to extend, and
+# the signature, which no longer matches.
+DROPPED_TABLES = ['DSIG', 'hdmx', 'LTSH']
+
+def glyph_ids_preserved(input_font, generated):
+    """Whether every glyph in input_font has the same name and glyph ID in
+    generated."""
+    input_order = input_font.getGlyphOrder()
+    return generated.getGlyphOrder()[:len(input_order)] == input_order
+
+def patch_font(input_font_file, generated, output_font_file):
+    """Write generated (a TTFont of the ligaturized font) to output_font_file,
+    with all the tables ligaturizing didn't change copied from input_font_file.
+
+    Returns False without writing anything if that isn't possible, which is
+    the case for variable fonts and if glyph IDs weren't preserved.
+    """
+    # Checking reads tables that must then be copied without being recompiled,
+    # so check with a copy of the input font.
+    input_font = TTFont(input_font_file)
+    if 'fvar' in input_font:
+        return False
+    if not glyph_ids_preserved(input_font, generated):
+        return False
+
+    output = TTFont(input_font_file)
+    for tag in RECOMPILED_TABLES:
+        if tag in output:
+            # Load them while the glyph order is still the input font's.
+            output[tag]
+    output.setGlyphOrder(generated.getGlyphOrder())
+    for tag in REPLACED_TABLES:
+        if tag in generated:
+            output[tag] = generated[tag]
+    drop_stale_tables(output)
+    output.save(output_font_file)
+    return True
+
+def drop_stale_tables(font):
+    """Remove the tables in DROPPED_TABLES from a font that had glyphs added."""
+    for tag in DROPPED_TABLES:
+        if tag in font:
+            del font[tag]
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#
+# Shaping tests for the lookups gsub.py plans: every option has to shape text
+# exactly like the default plan does, with each spacer glyph counted as the
+# same blank. The lookups are compiled into a font that only has the glyphs
+# they use, and the text is shaped with HarfBuzz. Needs fontTools and
+# uharfbuzz (pip install fonttools uharfbuzz); run with
+# python -m unittest test_gsub.
+
+import random
+import unittest
+from importlib.util import find_spec
+
+from char_dict import char_dict
+from gsub import GsubPlan
+from ligatures import ligatures
+
+LIGATURES = [tuple(lig['chars']) for lig in sorted(ligatures, key=lambda lig: len(lig['chars']))
+             if lig['firacode_ligature_name']]
+
+# Text that mixes ligatures up: known troublemakers, every pair of ligatures
+# in a row, and random runs of ligatures and their characters.
+TEXTS = ['>=>=>>', '<=<=<<', '=:=:==', '>->->>', '_|_|__']
+
+def corpus():
+    texts = list(TEXTS)
+    for a in LIGATURES:
+        for b in LIGATURES:
+            texts.append(''.join(char_dict[char] for char in a + b))
+    alphabet = sorted(set(char_dict[char] for lig in LIGATURES for char in lig))
+    rng = random.Random(5)
+    for _ in range(20000):
+        text = ''
+        while len(text) < 8:
+            if rng.random() < 0.5:
+                text += ''.join(char_dict[char] for char in rng.choice(LIGATURES))
+            else:
+                text += rng.choice(alphabet)
+        texts.append(text)
+    return texts
+
+def plan_lookups(**options):
+    """Plan the ligatures the way LigatureCreator does. Returns the plan and
+    the names of the spacer glyphs it uses."""
+    plan = GsubPlan(**options)
+    spacers = set()
+    for index, chars in enumerate(LIGATURES, 1):
+        if plan.uses_shared_spacer(chars):
+            spacer_names = ['LIG'] * (len(chars) - 1)
+        else:
+            spacer_names = ['CR.%d.%d' % (index, i) for i in range(len(chars) - 1)]
+        spacers.update(spacer_names)
+        plan.add_ligature(index, chars, 'lig.%d' % index, spacer_names)
+    return plan, spacers
+
+def build_font(plan, spacers):
+    """Compile a plan's lookups into a font, as bytes."""
+    from io import BytesIO
+    from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+    chars = sorted(set(char for lig in LIGATURES for char in lig))
+    glyph_order = ['.notdef'] + chars + sorted(spacers) + [
+        'lig.%d' % index for index in range(1, len(LIGATURES) + 1)]
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyph_order)
+    builder.setupCharacterMap(dict((ord(char_dict[char]), char) for char in chars))
+    empty = TTGlyphPen(None).glyph()
+    builder.setupGlyf(dict((name, empty) for name in glyph_order))
+    builder.setupHorizontalMetrics(dict((name, (600, 0)) for name in glyph_order))
+    builder.setupHorizontalHeader()
+    builder.setupNameTable({'familyName': 'Test', 'styleName': 'Regular'})
+    builder.setupOS2()
+    builder.setupPost()
+    addOpenTypeFeaturesFromString(builder.font, plan.to_fea())
+    data = BytesIO()
+    builder.font.save(data)
+    return data.getvalue()
+
+def shaper(plan, spacers):
+    """Return a function that shapes text with a plan's lookups into glyph
+    names, with every spacer glyph called 'spacer'."""
+    import uharfbuzz as hb
+
+    font = hb.Font(hb.Face(build_font(plan, spacers)))
+    def shape(text):
+        buf = hb.Buffer()
+        buf.add_str(text)
+        buf.guess_segment_properties()
+        hb.shape(font, buf, {})
+        names = [font.glyph_to_string(info.codepoint) for info in buf.glyph_infos]
+        return ['spacer' if name in spacers else name for name in names]
+    return shape
+
+
+@unittest.skipUnless(find_spec('fontTools') and find_spec('uharfbuzz'),
+                     'needs fontTools and uharfbuzz')
+class ShapingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.texts = corpus()
+        shape = shaper(*plan_lookups())
+        cls.expected = [shape(text) for text in cls.texts]
+
+    def check_shapes_like_default(self, **options):
+        shape = shaper(*plan_lookups(**options))
+        for text, expected in zip(self.texts, self.expected):
+            self.assertEqual(shape(text), expected, 'shaping %r' % text)
+
+    def test_merge_lookups(self):
+        self.check_shapes_like_default(merge_lookups=True)
+
+    def test_shared_spacer(self):
+        self.check_shapes_like_default(shared_spacer=True)
+
+    def test_shared_spacer_merge_lookups(self):
+        self.check_shapes_like_default(shared_spacer=True, merge_lookups=True)
+
+    def test_minimal_rules(self):
+        self.check_shapes_like_default(minimal_rules=True)
+
+    def test_minimal_rules_shared_spacer_merge_lookups(self):
+        self.check_shapes_like_default(
+            minimal_rules=True, shared_spacer=True, merge_lookups=True)
+
+    def test_ligature_stopped_partway(self):
+        # The '>=>' at the start is left unfinished; its spacers mustn't be
+        # taken for those of '=>>'.
+        shape = shaper(*plan_lookups(shared_spacer=True))
+        glyphs = shape('>=>=>>')
+        self.assertEqual(glyphs[:3], ['spacer', 'spacer', 'greater'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#
+# Tests for copying glyphs into the output font with LigatureCreator. Needs
+# fontforge; run with fontforge -lang=py -c "import unittest;
+# unittest.main(module='test_ligaturize')", or python -m unittest
+# test_ligaturize where fontforge's Python bindings are installed.
+
+import os
+import shutil
+import tempfile
+import unittest
+from importlib.util import find_spec
+
+if find_spec('fontforge'):
+    import fontforge
+    import psMat
+    from ligaturize import LigatureCreator
+    from outline_cache import OutlineCache
+
+# The advance width of every glyph in the test fonts, 'm' included, so that
+# copied characters don't need width correction.
+WIDTH = 600
+
+def draw_box(glyph, x0, y0, x1, y1):
+    pen = glyph.glyphPen(replace=False)
+    pen.moveTo((x0, y0))
+    pen.lineTo((x0, y1))
+    pen.lineTo((x1, y1))
+    pen.lineTo((x1, y0))
+    pen.closePath()
+    pen = None
+
+def new_glyph(font, char, name):
+    glyph = font.createChar(ord(char), name)
+    glyph.width = WIDTH
+    return glyph
+
+def target_font():
+    """A font with a colon made of references to its period, with TrueType
+    instructions and hints, as in plenty of real fonts."""
+    font = fontforge.font()
+    new_glyph(font, ' ', 'space')
+    draw_box(new_glyph(font, 'm', 'm'), 50, 0, 550, 500)
+    draw_box(new_glyph(font, '.', 'period'), 250, 0, 350, 100)
+    colon = new_glyph(font, ':', 'colon')
+    colon.addReference('period')
+    colon.addReference('period', psMat.translate(0, 400))
+    colon.ttinstrs = b'\xb0\x00'
+    colon.hhints = ((0, 100),)
+    return font
+
+def source_font():
+    """A ligature source with a colon made of two plain boxes."""
+    font = fontforge.font()
+    draw_box(new_glyph(font, 'm', 'm'), 50, 0, 550, 500)
+    colon = new_glyph(font, ':', 'colon')
+    draw_box(colon, 200, 0, 400, 150)
+    draw_box(colon, 200, 350, 400, 500)
+    return font
+
+def outline(glyph):
+    return sorted(
+        tuple(sorted((point.x, point.y) for point in contour))
+        for contour in glyph.foreground)
+
+
+@unittest.skipUnless(find_spec('fontforge'), 'needs fontforge')
+class CopyCharacterGlyphsTest(unittest.TestCase):
+
+    def copy_colon(self, font, source, **kwargs):
+        creator = LigatureCreator(font, source, scale_character_glyphs_threshold=0.1,
+                                  copy_character_glyphs=True, **kwargs)
+        creator.copy_character_glyphs(['colon'])
+        return creator
+
+    def test_composite_glyph_is_replaced(self):
+        font, source = target_font(), source_font()
+        self.copy_colon(font, source)
+        colon = font['colon']
+        self.assertEqual(colon.references, ())
+        self.assertEqual(bytes(colon.ttinstrs), b'')
+        self.assertEqual(colon.hhints, ())
+        self.assertEqual(outline(colon), outline(source['colon']))
+        self.assertEqual(colon.width, WIDTH)
+
+    def test_cache_hit_matches_cache_miss(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            # The outline cache is keyed by the source font's file.
+            source_file = os.path.join(tmp, 'source.sfd')
+            source_font().save(source_file)
+            source = fontforge.open(source_file)
+            cache = OutlineCache(os.path.join(tmp, 'outlines'), 1 << 20)
+
+            missed = target_font()
+            self.copy_colon(missed, source, outline_cache=cache).save_outline_cache()
+            hit = target_font()
+            creator = self.copy_colon(hit, source, outline_cache=cache)
+            self.assertEqual(creator.outline_cache_hits, 1)
+
+            for font in [missed, hit]:
+                self.assertEqual(font['colon'].references, ())
+                self.assertEqual(bytes(font['colon'].ttinstrs), b'')
+            self.assertEqual(outline(hit['colon']), outline(missed['colon']))
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
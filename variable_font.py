@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+#
+# Variable font support for the fonttools engine.
+#
+# A variable font gets one set of ligature glyphs that follows its weight axis,
+# rather than ligatures copied from a single Fira Code weight: every glyph is
+# copied (and width-corrected) at each of a handful of weights, and the
+# differences from the default weight stored as gvar deltas.
+#
+# The weights are those where anything involved stops varying linearly: the
+# font's own avar and HVAR regions, the Fira Code weights it maps onto (which
+# stop at Fira's lightest and boldest) and the regions of Fira Code's own
+# variations. In between, everything -- and so a copied glyph -- varies
+# linearly with the normalized weight, so one tent-shaped region per weight
+# reproduces the glyph at every weight. (Except for width correction of fonts
+# whose width varies with weight, which is only exact at those weights.)
+#
+# With a static ligature font, the ligatures look the same at every weight;
+# only their width correction varies.
+
+from fontTools.misc.fixedTools import floatToFixedToFloat
+from fontTools.misc.roundTools import otRound
+from fontTools.ttLib.tables import otTables
+from fontTools.ttLib.tables.TupleVariation import TupleVariation
+from fontTools.varLib.models import normalizeValue, piecewiseLinearMap
+
+from fonttools_engine import LigatureCreator, open_ligature_source
+
+# Fira Code's variable font, which the ligatures of variable fonts are copied
+# from unless --ligature-font-file is given.
+FIRA_VARIABLE = 'fonts/fira/distr/variable_ttf/FiraCode-VF.ttf'
+
+# The only axis ligatures vary along; it's the only one Fira Code has.
+AXIS = 'wght'
+
+def is_variable(font):
+    return 'fvar' in font and AXIS in [axis.axisTag for axis in font['fvar'].axes]
+
+
+class AxisMapping(object):
+    """Converts between user weights and the normalized weights (after avar)
+    that a variable font's variations are expressed in."""
+
+    def __init__(self, font):
+        axis = [axis for axis in font['fvar'].axes if axis.axisTag == AXIS][0]
+        self.triple = (axis.minValue, axis.defaultValue, axis.maxValue)
+        self.segments = {-1.0: -1.0, 0.0: 0.0, 1.0: 1.0}
+        if 'avar' in font and font['avar'].segments.get(AXIS):
+            self.segments = font['avar'].segments[AXIS]
+        self._inverse = dict((value, key) for key, value in self.segments.items())
+
+    def normalize(self, weight):
+        return piecewiseLinearMap(normalizeValue(weight, self.triple), self.segments)
+
+    def denormalize(self, value):
+        value = piecewiseLinearMap(value, self._inverse)
+        lower, default, upper = self.triple
+        if value < 0:
+            return default + value * (default - lower)
+        return default + value * (upper - default)
+
+    def clamp(self, weight):
+        lower, _, upper = self.triple
+        return min(max(weight, lower), upper)
+
+    def breakpoints(self):
+        """The normalized weights where the avar mapping has corners."""
+        return set([-1.0, 0.0, 1.0]) | set(self.segments.values())
+
+
+class VariableLigatureSource(object):
+    """A ligature source font that can be drawn at any weight."""
+
+    def __init__(self, font):
+        self.font = font
+        self.axis = AxisMapping(font) if is_variable(font) else None
+        self._glyph_sets = {}
+        self._weights = None
+
+    def weights(self):
+        """The user weights between which the glyphs vary linearly; empty for
+        a static font."""
+        if self.axis is None:
+            return []
+        if self._weights is None:
+            values = self.axis.breakpoints()
+            for variations in self.font['gvar'].variations.values():
+                for variation in variations:
+                    values.update(variation.axes.get(AXIS, ()))
+            self._weights = sorted(set(self.axis.denormalize(value) for value in values))
+        return self._weights
+
+    def glyph_set(self, weight=None):
+        """The glyphs at weight (clamped to the weights the font has)."""
+        if self.axis is None or weight is None:
+            return self.font.getGlyphSet()
+        weight = self.axis.clamp(weight)
+        if weight not in self._glyph_sets:
+            self._glyph_sets[weight] = self.font.getGlyphSet(location={AXIS: weight})
+        return self._glyph_sets[weight]
+
+# Wrapped ligature sources, keyed by path, like fonttools_engine._ligature_sources.
+_variable_sources = {}
+
+def open_variable_source(ligature_font_file):
+    if ligature_font_file not in _variable_sources:
+        _variable_sources[ligature_font_file] = VariableLigatureSource(
+            open_ligature_source(ligature_font_file))
+    else:
+        # Count the hit.
+        open_ligature_source(ligature_font_file)
+    return _variable_sources[ligature_font_file]
+
+
+def glyph_points(glyph, width):
+    """The points of a simple glyph, followed by the four phantom points that
+    gvar varies its metrics with."""
+    points = list(glyph.coordinates) if glyph.numberOfContours > 0 else []
+    return points + [(0, 0), (width, 0), (0, 0), (0, 0)]
+
+def compatible(glyph, other):
+    """Whether two glyphs have the same contours and on-curve points, so that
+    one can be expressed as deltas from the other."""
+    if glyph.numberOfContours != other.numberOfContours:
+        return False
+    if glyph.numberOfContours <= 0:
+        return True
+    return (glyph.endPtsOfContours == other.endPtsOfContours and
+            [flag & 1 for flag in glyph.flags] == [flag & 1 for flag in other.flags])
+
+def prune_samples(samples):
+    """Drop the samples (value, deltas) that are linear interpolations of their
+    neighbours. The default (value 0) and the ends are always kept."""
+    pruned = list(samples)
+    i = 1
+    while i < len(pruned) - 1:
+        (before, low), (value, deltas), (after, high) = pruned[i - 1:i + 2]
+        if value != 0:
+            t = (value - before) / (after - before)
+            if all(abs(a + (b - a) * t - d) <= 0.5
+                   for l, h, m in zip(low, high, deltas)
+                   for a, b, d in zip(l, h, m)):
+                del pruned[i]
+                continue
+        i += 1
+    return pruned
+
+
+class VariableLigatureCreator(LigatureCreator):
+    """A LigatureCreator for variable fonts with TrueType outlines, which
+    copies every glyph at each breakpoint weight and stores the differences
+    in gvar (and the advance widths of new glyphs in HVAR)."""
+
+    def __init__(self, font, source, **kwargs):
+        if 'gvar' not in font:
+            raise ValueError("Only variable fonts with TrueType outlines are"
+                             " supported by the fonttools engine")
+        LigatureCreator.__init__(self, font, source.font, **kwargs)
+        self.variable_source = source
+        self.axis = AxisMapping(font) if is_variable(font) else None
+        self.variations = font['gvar'].variations
+        self.hvar = font['HVAR'].table if 'HVAR' in font else None
+        if self.hvar:
+            if self.hvar.AdvWidthMap is None:
+                # Implicit mapping by glyph ID, which new glyphs can't use.
+                advance_map = otTables.VarIdxMap()
+                advance_map.mapping = dict(
+                    (name, i) for i, name in enumerate(self.glyph_order))
+                self.hvar.AdvWidthMap = advance_map
+            # Optional, and there's nothing to map new glyphs to.
+            self.hvar.LsbMap = self.hvar.RsbMap = None
+        self.static_glyph_count = 0
+
+        self.breakpoints = self.find_breakpoints()
+        # (em width, space width) at each breakpoint.
+        self._widths = {}
+        for value in self.breakpoints:
+            glyph_set = font.getGlyphSet(location={AXIS: value}, normalized=True)
+            self._widths[value] = (
+                otRound(glyph_set[self.cmap[ord('m')]].width),
+                otRound(glyph_set[self.cmap[ord(' ')]].width))
+
+    def find_breakpoints(self):
+        """Return the normalized weights to copy glyphs at, including the
+        default, 0, in ascending order."""
+        if self.axis is None:
+            return [0.0]
+        values = self.axis.breakpoints()
+        if self.hvar:
+            index = [axis.axisTag for axis in self.font['fvar'].axes].index(AXIS)
+            for region in self.hvar.VarStore.VarRegionList.Region:
+                axis = region.VarRegionAxis[index]
+                values.update([axis.StartCoord, axis.PeakCoord, axis.EndCoord])
+        for weight in self.variable_source.weights():
+            if self.axis.clamp(weight) == weight:
+                values.add(self.axis.normalize(weight))
+        # Regions are stored as F2Dot14, so copy glyphs exactly where they'll be.
+        return sorted(set(floatToFixedToFloat(value, 14) for value in values))
+
+    def move_to(self, value):
+        """Copy glyphs at the normalized weight value from now on."""
+        weight = self.axis.denormalize(value) if self.axis else None
+        self.source_glyphs = self.variable_source.glyph_set(weight)
+        self.emwidth, self.spacewidth = self._widths[value]
+
+    def vary(self, name, copy, width_glyph):
+        """Call copy() -- which sets the glyph called name -- at every
+        breakpoint, and store the glyph's variations from the default in gvar.
+        The glyph's advance width varies like width_glyph's."""
+        samples = {}
+        for value in self.breakpoints:
+            if value:
+                self.move_to(value)
+                copy()
+                samples[value] = (self.font['glyf'][name], self.hmtx[name][0])
+        # Copy the default last, so that it's what ends up in glyf.
+        self.move_to(0.0)
+        copy()
+        default = self.font['glyf'][name]
+        default_points = glyph_points(default, self.hmtx[name][0])
+
+        self.variations[name] = []
+        if self.hvar:
+            mapping = self.hvar.AdvWidthMap.mapping
+            mapping[name] = mapping[width_glyph]
+        if not all(compatible(default, glyph) for glyph, _ in samples.values()):
+            # Fira's glyph converted to different points at different weights.
+            self.static_glyph_count += 1
+            return
+
+        deltas = [(value, [(0, 0)] * len(default_points)) if not value else (value, [
+            (x - x0, y - y0)
+            for (x, y), (x0, y0) in zip(glyph_points(*samples[value]), default_points)])
+            for value in self.breakpoints]
+        deltas = prune_samples(deltas)
+        for i, (value, delta) in enumerate(deltas):
+            if not value or not any(x or y for x, y in delta):
+                continue
+            start = deltas[i - 1][0] if i > 0 else value
+            end = deltas[i + 1][0] if i + 1 < len(deltas) else value
+            self.variations[name].append(
+                TupleVariation({AXIS: (start, value, end)}, delta))
+
+    def copy_character_glyph(self, source_name, name):
+        self.vary(name, lambda: LigatureCreator.copy_character_glyph(self, source_name, name),
+                  self.cmap[ord('m')])
+
+    def copy_ligature_glyph(self, source_name, name):
+        self.vary(name, lambda: LigatureCreator.copy_ligature_glyph(self, source_name, name),
+                  self.cmap[ord('m')])
+
+    def create_spacer_glyph(self, name):
+        self.vary(name, lambda: LigatureCreator.create_spacer_glyph(self, name),
+                  self.cmap[ord(' ')])
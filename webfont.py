@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#
+# Subset web font output for ligaturize.py --subset-corpus, --subset-chars
+# and --subset-ligatures.
+#
+# Fonts served to browsers are downloaded before any text shows up, so there
+# only the glyphs some known text needs are worth their bytes. A WebSubset is
+# the characters that text uses and the ligatures from ligatures.py that occur
+# in it. Ligatures that don't occur are never added to the font at all, so
+# there are no lookups for them to prune; then a copy of the output font is
+# subset to the characters (with fontTools.subset, which keeps every glyph the
+# remaining ligatures substitute in) and also written as WOFF2. Needs
+# fontTools and, for WOFF2, brotli (pip install fonttools brotli).
+
+import os
+from os import path
+
+from char_dict import char_dict
+from ligatures import ligatures
+
+# Always kept, even if the text doesn't have them: spacer glyphs are copies
+# of the space, and plenty of text has no spaces in it.
+ALWAYS_KEPT = ' '
+
+
+class WebSubset(object):
+    """The characters and ligatures a subset font keeps."""
+
+    def __init__(self):
+        self.chars = set(ALWAYS_KEPT)
+        # The ligatures from ligatures.py that occur, as the text they replace.
+        self.ligatures = set()
+        # All of them, and those that haven't occurred yet.
+        self.known = set(ligature_text(lig['chars']) for lig in ligatures
+                         if lig['firacode_ligature_name'])
+        self._candidates = set(self.known)
+
+    def add_text(self, text):
+        """Keep the characters in text, and the ligatures that occur in it."""
+        self.chars.update(text)
+        found = set(candidate for candidate in self._candidates if candidate in text)
+        self.ligatures |= found
+        self._candidates -= found
+
+    def add_file(self, file):
+        """Keep what text file needs. Files that aren't UTF-8 (images and
+        the like, in a corpus directory) are skipped; files that can't be read
+        at all, e.g. a mistyped path, are an error."""
+        try:
+            with open(file, encoding='utf-8') as fd:
+                for line in fd:
+                    self.add_text(line)
+        except UnicodeDecodeError:
+            pass
+
+    def keeps(self, lig):
+        """Whether a ligature spec from ligatures.py is needed."""
+        if lig['firacode_ligature_name'] is None:
+            # Individual characters; the subsetter drops the unused ones.
+            return True
+        return ligature_text(lig['chars']) in self.ligatures
+
+    def describe(self):
+        return '%d characters and %d of %d ligatures' % (
+            len(self.chars), len(self.ligatures), len(self.known))
+
+    def unicodes(self):
+        return sorted(ord(char) for char in self.chars)
+
+def ligature_text(chars):
+    return ''.join(char_dict[char] for char in chars)
+
+def corpus_files(paths):
+    """The files in paths, and in the directories in paths, recursively."""
+    for name in paths:
+        if path.isdir(name):
+            for root, dirs, files in os.walk(name):
+                # Skip hidden directories, like .git.
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for file in sorted(files):
+                    yield path.join(root, file)
+        else:
+            yield name
+
+# WebSubsets already built in this process, keyed by their arguments; scanning
+# a corpus once is enough for every font.
+_subsets = {}
+
+def web_subset(corpus=None, chars=None, ligature_list=None):
+    """Return the WebSubset for the text in the corpus files and directories,
+    the characters in chars and the ligatures in ligature_list (their text,
+    separated by whitespace, e.g. '-> => !=')."""
+    key = (tuple(corpus or ()), chars, ligature_list)
+    if key not in _subsets:
+        subset = WebSubset()
+        for file in corpus_files(corpus or ()):
+            subset.add_file(file)
+        for char in chars or '':
+            subset.add_text(char)
+        for text in (ligature_list or '').split():
+            if text not in subset.known:
+                raise ValueError("%s isn't a ligature in ligatures.py" % text)
+            subset.add_text(text)
+        _subsets[key] = subset
+    return _subsets[key]
+
+def subset_font(font_file, subset):
+    """Subset the font in font_file to subset, and write the result next to it
+    both as e.g. Foo.subset.ttf and as Foo.woff2, leaving font_file itself
+    alone. Returns the paths of the two."""
+    from fontTools import subset as subsetter
+    from fontTools.ttLib import TTFont
+
+    options = subsetter.Options()
+    # Keep all of the font's features, not just those browsers turn on by
+    # default, and all of its names.
+    options.layout_features = ['*']
+    options.name_IDs = ['*']
+    options.name_languages = ['*']
+    options.notdef_outline = True
+
+    font = TTFont(font_file)
+    worker = subsetter.Subsetter(options)
+    worker.populate(unicodes=subset.unicodes())
+    worker.subset(font)
+    base, ext = path.splitext(font_file)
+    subset_file = base + '.subset' + ext
+    font.save(subset_file)
+
+    woff2_file = base + '.woff2'
+    font.flavor = 'woff2'
+    font.save(woff2_file)
+    return subset_file, woff2_file
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# Worker processes with bounded memory, for build.py --max-jobs-per-worker and
+# --max-worker-memory.
+#
+# Ligaturizing a font leaves some memory behind in the process that did it --
+# fontforge's caches, fragmentation, ligature sources opened at another em
+# size -- so a worker that ligaturizes a whole large family keeps growing. A
+# RecyclingPool replaces each worker with a fresh one once it has run a given
+# number of jobs or its resident memory has grown past a limit. Jobs are handed
+# out one at a time, so a worker that's about to be replaced never has any
+# queued up, and a worker that dies (e.g. killed for running out of memory)
+# only costs the job it was running.
+
+from multiprocessing import get_all_start_methods, get_context
+from multiprocessing.connection import wait
+
+from joblog import current_rss
+
+def worker_main(connection, fn, max_jobs, max_rss):
+    """Run fn on the jobs sent over connection, sending back (result, whether
+    this worker is done), until told to stop or it's time to be replaced."""
+    jobs_done = 0
+    for job in iter(connection.recv, None):
+        result = fn(job)
+        jobs_done += 1
+        retire = bool((max_jobs and jobs_done >= max_jobs) or
+                      (max_rss and current_rss() > max_rss))
+        connection.send((result, retire))
+        if retire:
+            break
+    connection.close()
+
+
+class RecyclingPool(object):
+    """Runs a function on jobs in up to size worker processes, each replaced
+    after max_jobs jobs or once it uses more than max_rss bytes (0 for no
+    limit)."""
+
+    def __init__(self, size, max_jobs=0, max_rss=0):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss
+        # Workers are forks of this process, like those of build.py's Pool.
+        if 'fork' in get_all_start_methods():
+            self.context = get_context('fork')
+        else:
+            self.context = get_context()
+        self.workers_started = 0
+
+    def _start_worker(self, fn):
+        connection, worker_connection = self.context.Pipe()
+        process = self.context.Process(
+            target=worker_main, args=(worker_connection, fn, self.max_jobs, self.max_rss))
+        process.start()
+        worker_connection.close()
+        self.workers_started += 1
+        return connection, process
+
+    def imap_unordered(self, fn, jobs, crashed):
+        """Yield fn(job) for every job, as they finish. If a worker dies while
+        running a job, yield crashed(job, its exit code) instead."""
+        pending = list(reversed(list(jobs)))
+        # {connection: (process, job it's running)}
+        running = {}
+        while pending or running:
+            while pending and len(running) < self.size:
+                connection, process = self._start_worker(fn)
+                job = pending.pop()
+                connection.send(job)
+                running[connection] = (process, job)
+
+            for connection in wait(list(running)):
+                process, job = running.pop(connection)
+                try:
+                    result, retire = connection.recv()
+                except EOFError:
+                    # The worker died without answering.
+                    process.join()
+                    connection.close()
+                    yield crashed(job, process.exitcode)
+                    continue
+                if retire or not pending:
+                    if not retire:
+                        connection.send(None)
+                    process.join()
+                    connection.close()
+                else:
+                    job = pending.pop()
+                    connection.send(job)
+                    running[connection] = (process, job)
+                yield result